@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+# Every request runs its sync code, ORM calls included, in threads of its
+# own, so persistent connections would pile up instead of being reused.
+if not os.environ.get('DATABASE_CONN_MAX_AGE'):
+    os.environ['DATABASE_CONN_MAX_AGE'] = '0'
 
 application = get_asgi_application()
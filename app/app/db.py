@@ -0,0 +1,134 @@
+"""
+Database configuration from the environment.
+
+database_config() builds the primary's DATABASES entry from DATABASE_*
+variables and replica_config() the read replica's, see app.routers:
+
+- DATABASE_ENGINE: sqlite (default) or postgresql, with DATABASE_NAME and,
+  for PostgreSQL, DATABASE_USER, DATABASE_PASSWORD, DATABASE_HOST and
+  DATABASE_PORT.
+- DATABASE_CONN_MAX_AGE: seconds a connection is reused across requests,
+  0 for a connection per request (default 60, and 0 under ASGI, see
+  app.asgi, where connections are not reused). DATABASE_CONN_HEALTH_CHECKS
+  checks a reused connection before its first query in a request, so a
+  connection dropped by the server does not fail the request (default on).
+- DATABASE_SQLITE_WAL: put SQLite in WAL mode with synchronous=NORMAL, so
+  readers do not block the writer and commits skip an fsync (default on).
+  DATABASE_SQLITE_BUSY_TIMEOUT: milliseconds a connection waits for a lock
+  before failing with "database is locked" (default 5000).
+- DATABASE_POOL: pgbouncer when PostgreSQL is reached through PgBouncer in
+  transaction pooling mode, or native for the connection pool of
+  Django 5.1+, sized by DATABASE_POOL_MIN_SIZE and DATABASE_POOL_MAX_SIZE.
+- DATABASE_REPLICA_NAME, DATABASE_REPLICA_HOST and DATABASE_REPLICA_PORT
+  override the primary's settings for the replica.
+
+The SQLite pragmas are applied by apply_sqlite_pragmas whenever a
+connection is opened.
+"""
+import os
+
+import django
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+ENGINES = {
+    'sqlite': 'django.db.backends.sqlite3',
+    'postgresql': 'django.db.backends.postgresql',
+}
+
+
+def env_int(environ, name, default):
+    value = environ.get(name, '')
+    try:
+        return int(value) if value else default
+    except ValueError:
+        raise ImproperlyConfigured(f'{name} must be an integer.')
+
+
+def env_flag(environ, name, default):
+    value = environ.get(name, '')
+    return value.lower() in ('1', 'true', 'yes', 'on') if value else default
+
+
+def sqlite_pragmas(environ):
+    """Return the pragmas set on every new SQLite connection, in order."""
+    pragmas = {'busy_timeout': env_int(environ, 'DATABASE_SQLITE_BUSY_TIMEOUT', 5000)}
+    if env_flag(environ, 'DATABASE_SQLITE_WAL', True):
+        pragmas['journal_mode'] = 'WAL'
+        pragmas['synchronous'] = 'NORMAL'
+    return pragmas
+
+
+def pool_config(environ):
+    """Return the settings for DATABASE_POOL on PostgreSQL."""
+    pool = environ.get('DATABASE_POOL', '')
+    if not pool:
+        return {}
+    if pool == 'pgbouncer':
+        # Server-side cursors do not survive transaction pooling.
+        return {'DISABLE_SERVER_SIDE_CURSORS': True}
+    if pool == 'native':
+        if django.VERSION < (5, 1):
+            raise ImproperlyConfigured('DATABASE_POOL=native requires Django 5.1 or later.')
+        return {
+            # Pooled connections go back to the pool at the end of each request.
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {'pool': {
+                'min_size': env_int(environ, 'DATABASE_POOL_MIN_SIZE', 2),
+                'max_size': env_int(environ, 'DATABASE_POOL_MAX_SIZE', 10),
+            }},
+        }
+    raise ImproperlyConfigured(f'Unknown DATABASE_POOL {pool!r}, use pgbouncer or native.')
+
+
+def database_config(base_dir, environ=os.environ):
+    """Return the DATABASES entry of the primary database."""
+    engine = environ.get('DATABASE_ENGINE', 'sqlite')
+    if engine not in ENGINES:
+        raise ImproperlyConfigured(f'Unknown DATABASE_ENGINE {engine!r}, use one of {", ".join(ENGINES)}.')
+
+    config = {
+        'ENGINE': ENGINES[engine],
+        'CONN_MAX_AGE': env_int(environ, 'DATABASE_CONN_MAX_AGE', 60),
+        'CONN_HEALTH_CHECKS': env_flag(environ, 'DATABASE_CONN_HEALTH_CHECKS', True),
+    }
+    if engine == 'sqlite':
+        config['NAME'] = environ.get('DATABASE_NAME') or base_dir / 'db.sqlite3'
+        config['PRAGMAS'] = sqlite_pragmas(environ)
+    else:
+        config.update(
+            NAME=environ.get('DATABASE_NAME', 'app'),
+            USER=environ.get('DATABASE_USER', ''),
+            PASSWORD=environ.get('DATABASE_PASSWORD', ''),
+            HOST=environ.get('DATABASE_HOST', ''),
+            PORT=environ.get('DATABASE_PORT', ''),
+        )
+        config.update(pool_config(environ))
+    return config
+
+
+def replica_config(primary, environ=os.environ):
+    """Return the DATABASES entry of the read replica, mirrored to the primary in tests."""
+    config = {**primary, 'TEST': {'MIRROR': 'default'}}
+    for key in ('NAME', 'HOST', 'PORT'):
+        if environ.get(f'DATABASE_REPLICA_{key}'):
+            config[key] = environ[f'DATABASE_REPLICA_{key}']
+    return config
+
+
+def replica_configured(environ=os.environ):
+    return bool(environ.get('DATABASE_REPLICA_NAME') or environ.get('DATABASE_REPLICA_HOST'))
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Set the configured PRAGMAS on a new SQLite connection.
+
+    They run on the raw connection, so they are neither logged nor counted
+    as queries of the request that opened it.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in connection.settings_dict.get('PRAGMAS', {}).items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,247 @@
+"""
+Per-endpoint request metrics.
+
+MetricsMiddleware records, for every request, its latency, the number and
+duration of database queries, the time spent in serializers and the size of
+the response, grouped by URL name. The numbers live in process memory and are
+exported in the Prometheus text format by metrics_view. Requests going over
+METRICS_QUERY_BUDGET or METRICS_LATENCY_BUDGET are logged as warnings.
+"""
+import logging
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+from rest_framework import authentication, permissions
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.settings import api_settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': ('Request latency.', LATENCY_BUCKETS),
+    'http_request_db_queries': ('Database queries per request.', QUERY_COUNT_BUCKETS),
+    'http_request_db_duration_seconds': ('Time spent in database queries per request.', LATENCY_BUCKETS),
+    'http_request_serializer_duration_seconds': ('Time spent in serializers per request.', LATENCY_BUCKETS),
+    'http_response_size_bytes': ('Response body size.', SIZE_BUCKETS),
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Thread-safe store of the request metrics of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.requests = {}
+        self.collectors = []
+
+    def register_collector(self, collector):
+        """Add a callable returning extra (name, help, type, {labels: value}) metrics to export."""
+        self.collectors.append(collector)
+
+    def record(self, endpoint, method, status, observations):
+        with self.lock:
+            key = (endpoint, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            for name, value in observations.items():
+                histogram = self.histograms.get((name, endpoint, method))
+                if histogram is None:
+                    histogram = self.histograms[(name, endpoint, method)] = Histogram(HISTOGRAMS[name][1])
+                histogram.observe(value)
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.requests.clear()
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = [
+            '# HELP http_requests_total Requests by endpoint, method and status.',
+            '# TYPE http_requests_total counter',
+        ]
+        with self.lock:
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{format_labels(endpoint=endpoint, method=method, status=status)} {count}')
+            for name, (help_text, _) in HISTOGRAMS.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (histogram_name, endpoint, method), histogram in sorted(self.histograms.items()):
+                    if histogram_name == name:
+                        lines += render_histogram(name, histogram, endpoint=endpoint, method=method)
+
+        for collector in self.collectors:
+            for name, help_text, metric_type, samples in collector():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {metric_type}']
+                lines += [f'{name}{format_labels(**dict(labels))} {value}' for labels, value in sorted(samples.items())]
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(**labels):
+    if not labels:
+        return ''
+    escaped = (
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def render_histogram(name, histogram, **labels):
+    lines = []
+    cumulative = 0
+    for bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{format_labels(**labels, le=bound)} {cumulative}')
+    lines.append(f'{name}_sum{format_labels(**labels)} {histogram.sum}')
+    lines.append(f'{name}_count{format_labels(**labels)} {histogram.count}')
+    return lines
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+    """Counters collected while a single request is handled."""
+    __slots__ = ('queries', 'query_seconds', 'serializer_seconds', 'serializing')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializing = False
+
+
+current_request_metrics = ContextVar('current_request_metrics', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    """Database execute wrapper adding each query to the current request's metrics."""
+    metrics = current_request_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.query_seconds += perf_counter() - start
+
+
+class TimedSerializerMixin:
+    """Add the time a serializer spends building its output to the request metrics.
+
+    Nested and child serializers are not timed again on their own.
+    """
+
+    def to_representation(self, instance):
+        metrics = current_request_metrics.get()
+        if metrics is None or metrics.serializing:
+            return super().to_representation(instance)
+        metrics.serializing = True
+        start = perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializing = False
+            metrics.serializer_seconds += perf_counter() - start
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    """Wrap every new database connection with count_query.
+
+    The wrapper stays installed for the connection's lifetime and only counts
+    while a request is measured, which also covers queries that async views
+    run on another thread through the async ORM.
+    """
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class MetricsMiddleware:
+    """Record latency, query and serializer metrics for every request."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        start = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request_metrics.reset(token)
+        self.record(request, response, metrics, perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = current_request_metrics.set(metrics)
+        start = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request_metrics.reset(token)
+        self.record(request, response, metrics, perf_counter() - start)
+        return response
+
+    def record(self, request, response, metrics, duration):
+        match = request.resolver_match
+        endpoint = (match.view_name or match.route) if match else 'unresolved'
+        observations = {
+            'http_request_duration_seconds': duration,
+            'http_request_db_queries': metrics.queries,
+            'http_request_db_duration_seconds': metrics.query_seconds,
+            'http_request_serializer_duration_seconds': metrics.serializer_seconds,
+        }
+        if not response.streaming:
+            observations['http_response_size_bytes'] = len(response.content)
+        registry.record(endpoint, request.method, response.status_code, observations)
+
+        if metrics.queries > settings.METRICS_QUERY_BUDGET or duration > settings.METRICS_LATENCY_BUDGET:
+            logger.warning(
+                '%s %s (%s) over budget: %.3fs, %d queries in %.3fs, %.3fs serializing',
+                request.method, request.path, endpoint, duration,
+                metrics.queries, metrics.query_seconds, metrics.serializer_seconds,
+            )
+
+
+@api_view(['GET'])
+@authentication_classes([*api_settings.DEFAULT_AUTHENTICATION_CLASSES, authentication.SessionAuthentication])
+@permission_classes([permissions.IsAdminUser])
+def metrics_view(request):
+    """Export the request metrics of this process for Prometheus."""
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
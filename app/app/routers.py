@@ -0,0 +1,147 @@
+"""
+Read replica routing.
+
+Views serving read-heavy traffic opt in with ReplicaReadMixin: their GET
+and HEAD requests read from READ_REPLICA_ALIAS, while everything else, and
+every write, uses the primary. Requests read their own writes: once a
+request writes, its remaining reads go to the primary, and so do those of
+the same user, or of the same browser through a cookie, for
+READ_REPLICA_STICKY_SECONDS, which should cover the replication lag.
+
+The routing state of a request lives in a context variable set up by
+ReplicaRoutingMiddleware, so it follows the request into the threads that
+run async ORM calls. Code outside a request always uses the primary.
+Reads on the replica may lag the primary, so catalogue responses cached
+right after a change can be stale until STORE_RESPONSE_CACHE_TIMEOUT.
+"""
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_COOKIE = 'db_primary'
+
+
+class RoutingState:
+    """Where the current request reads from, and whether it has written."""
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+current_routing_state = ContextVar('current_routing_state', default=None)
+
+
+def pin_cache_key(user_id):
+    return f'db:primary:{user_id}'
+
+
+def is_pinned(request, user=None):
+    """Return whether the request must read from the primary after a recent write."""
+    if request.COOKIES.get(PIN_COOKIE):
+        return True
+    return bool(user is not None and user.is_authenticated and cache.get(pin_cache_key(user.pk)))
+
+
+def use_replica(request, user=None):
+    """Send the rest of the current request's reads to the replica, if one is configured.
+
+    Does nothing when the request has written or must read its own recent writes.
+    """
+    state = current_routing_state.get()
+    if state is None or state.wrote or not settings.READ_REPLICA_ALIAS or is_pinned(request, user):
+        return
+    state.replica = settings.READ_REPLICA_ALIAS
+
+
+class ReplicaReadMixin:
+    """Serve the safe requests of a DRF view from the read replica."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            use_replica(request, request.user)
+
+
+class ReplicaRouter:
+    """Route reads to the request's replica, if any.
+
+    Otherwise it has no opinion, so Django's default applies: the database of
+    the instance at hand, or the primary. Instances read from the replica are
+    written to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = current_routing_state.get()
+        if state is not None and state.replica and not state.wrote:
+            return state.replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = current_routing_state.get()
+        if state is not None:
+            state.wrote = True
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == settings.READ_REPLICA_ALIAS:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, settings.READ_REPLICA_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # The replica gets its schema and data through replication.
+        if db == settings.READ_REPLICA_ALIAS:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Track the routing state of every request and pin users to the primary after writes."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RoutingState()
+        token = current_routing_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing_state.reset(token)
+        if state.wrote:
+            self.pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        state = RoutingState()
+        token = current_routing_state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing_state.reset(token)
+        if state.wrote:
+            self.pin(request, response)
+        return response
+
+    def pin(self, request, response):
+        """Keep the client's reads on the primary while the replica catches up."""
+        timeout = settings.READ_REPLICA_STICKY_SECONDS
+        response.set_cookie(PIN_COOKIE, '1', max_age=timeout, httponly=True, samesite='Lax')
+        # DRF authenticates in the view and leaves the user on the request.
+        user = request.__dict__.get('user')
+        if user is not None and getattr(user, 'is_authenticated', False):
+            cache.set(pin_cache_key(user.pk), True, timeout)
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 import os
 
+from app.db import database_config, replica_config, replica_configured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -47,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.metrics.MetricsMiddleware',
+    'app.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,13 +84,71 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Built from DATABASE_* environment variables, see app.db for the options:
+# persistent connections, SQLite pragmas and PostgreSQL connection pooling.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
 }
 
+# Read replica, see app.routers. Catalogue and statistics reads go to the
+# replica when DATABASE_REPLICA_NAME or DATABASE_REPLICA_HOST is set; tests
+# mirror it to the primary. After a write, the client reads from the primary
+# for READ_REPLICA_STICKY_SECONDS, which should exceed the replication lag.
+DATABASES['replica'] = replica_config(DATABASES['default'])
+READ_REPLICA_ALIAS = 'replica' if replica_configured() else None
+READ_REPLICA_STICKY_SECONDS = 10
+DATABASE_ROUTERS = ['app.routers.ReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Request metrics, see app.metrics. Requests above either budget are logged.
+METRICS_QUERY_BUDGET = 50
+METRICS_LATENCY_BUDGET = 0.5
+
+# Serve the catalogue reads on their regular URLs with the async views of
+# store.async_views, which pays off under an ASGI server. They are always
+# available under api/store/async/ as well.
+STORE_ASYNC_CATALOGUE = os.environ.get('STORE_ASYNC_CATALOGUE', '').lower() in ('1', 'true')
+
+# Shopping carts, see store.carts. Carts are dropped after STORE_CART_TIMEOUT
+# seconds without changes.
+STORE_CART_CACHE_ALIAS = 'default'
+STORE_CART_TIMEOUT = 60 * 60 * 24 * 14
+STORE_CART_MAX_ITEMS = 100
+
+# Merchant dashboard, see store.dashboard. Windows are numbers of days up to
+# and including today; dashboards are cached in the catalogue response cache.
+STORE_DASHBOARD_WINDOWS = (7, 30, 90)
+STORE_DASHBOARD_TOP_PRODUCTS = 5
+STORE_DASHBOARD_CACHE_TIMEOUT = 60 * 15
+
+# Token authentication cache, see user.authentication. Set the alias to None
+# to keep entries in process memory only.
+AUTH_TOKEN_CACHE_ALIAS = 'default'
+AUTH_TOKEN_CACHE_TIMEOUT = 300
+AUTH_TOKEN_LOCAL_CACHE_SIZE = 10000
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT = 30
+
+# Catalogue response cache, see store.cache.
+STORE_RESPONSE_CACHE_ALIAS = 'default'
+STORE_RESPONSE_CACHE_TIMEOUT = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -132,7 +194,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'user.User'
 
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': ['rest_framework.authentication.TokenAuthentication'],
+    'DEFAULT_AUTHENTICATION_CLASSES': ['user.authentication.CachedTokenAuthentication'],
     'DEFAULT_SCHEMA_CLASS': "drf_spectacular.openapi.AutoSchema",
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
@@ -162,4 +224,16 @@ Whether you're a customer looking to shop or a merchant managing your products,
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Product image renditions generated by store.tasks.generate_product_renditions.
+PRODUCT_IMAGE_RENDITION_WIDTHS = (200, 400, 800)
+PRODUCT_IMAGE_RENDITION_FORMATS = ('WEBP', 'JPEG')
+PRODUCT_IMAGE_RENDITION_QUALITY = 85
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+CELERY_BEAT_SCHEDULE = {
+    'send-payment-reminders': {
+        'task': 'store.tasks.send_payment_reminders',
+        'schedule': 15 * 60,
+    },
+}
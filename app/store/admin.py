@@ -1,19 +1,155 @@
+from datetime import timedelta
+
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils import timezone
 from rest_framework.authtoken.models import Token
 from .models import Product, Order, Category
+from .pagination import EstimatedCountPaginator
+from .search import get_search_backend
 from user.models import User
 
+
+class DateHierarchyQuerySet(models.QuerySet):
+    """Queryset of admin changelists with a date_hierarchy on a large table."""
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None, **kwargs):
+        """Like QuerySet.datetimes(), but probing an index instead of scanning for years, months and days.
+
+        SELECT DISTINCT over the truncated dates reads every matching row,
+        which makes the admin date hierarchy slow on a large table. Here the
+        first and last dates are read from the index, and each year, month or
+        day between them is kept if an EXISTS over its range finds a row. The
+        dates are returned as a list, which is all the date hierarchy needs.
+        """
+        if kind not in ('year', 'month', 'day'):
+            return super().datetimes(field_name, kind, order, tzinfo, **kwargs)
+        dates = self.order_by(field_name).values_list(field_name, flat=True)
+        first, last = dates.first(), dates.reverse().first()
+        if first is None:
+            return []
+
+        start = timezone.localtime(first, tzinfo).replace(hour=0, minute=0, second=0, microsecond=0)
+        if kind in ('year', 'month'):
+            start = start.replace(day=1)
+        if kind == 'year':
+            start = start.replace(month=1)
+        found = []
+        while start <= last:
+            if kind == 'year':
+                end = start.replace(year=start.year + 1)
+            elif kind == 'month':
+                end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+            else:
+                end = start + timedelta(days=1)
+            if self.filter(**{f'{field_name}__gte': start, f'{field_name}__lt': end}).exists():
+                found.append(start)
+            start = end
+        return found if order == 'ASC' else found[::-1]
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """Filter on a foreign key picked with the admin's autocomplete widget.
+
+    Unlike the default related-field filter it does not list every related
+    object in the sidebar; the related model's admin must define
+    search_fields. ModelAdmins using it need AutocompleteFilterMixin for the
+    widget's scripts.
+    """
+    template = 'admin/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        self.parameter_name = f'{self.field_name}__id__exact'
+        super().__init__(request, params, model, model_admin)
+        field = model._meta.get_field(self.field_name)
+        if self.value():
+            try:
+                self.used_parameters[self.parameter_name] = field.target_field.to_python(self.value())
+            except ValidationError as e:
+                raise IncorrectLookupParameters(e)
+        form_field = field.formfield(widget=AutocompleteSelect(field, model_admin.admin_site), required=False)
+        self.rendered_widget = form_field.widget.render(
+            self.parameter_name, self.value(), {'id': f'filter_{self.field_name}', 'style': 'width: 100%'},
+        )
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{f'{self.field_name}_id': self.value()})
+        return queryset
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'display': 'All',
+        }
+
+
+class AutocompleteFilterMixin:
+    """Load the scripts of the changelist's AutocompleteFilters."""
+
+    @property
+    def media(self):
+        media = super().media
+        for list_filter in self.list_filter:
+            if isinstance(list_filter, type) and issubclass(list_filter, AutocompleteFilter):
+                field = self.model._meta.get_field(list_filter.field_name)
+                media += AutocompleteSelect(field, self.admin_site).media
+        return media
+
+
+class MerchantFilter(AutocompleteFilter):
+    title = 'merchant'
+    field_name = 'merchant'
+
+
+class CustomerFilter(AutocompleteFilter):
+    title = 'customer'
+    field_name = 'customer'
+
+
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
     list_display = ('name', 'price', 'category', 'merchant')
+    list_select_related = ('category', 'merchant')
     search_fields = ('name', 'description')
-    list_filter = ('category', 'merchant')
+    list_filter = ('category', MerchantFilter)
+    autocomplete_fields = ('category', 'merchant')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return get_search_backend().filter(queryset, search_term), False
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ('customer', 'order_date', 'total_price')
+class OrderAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
+    list_display = ('customer', 'order_date', 'total_price', 'item_count')
+    list_select_related = ('customer',)
     search_fields = ('customer__name', 'customer__email')
-    list_filter = ('order_date',)
+    list_filter = (CustomerFilter,)
+    date_hierarchy = 'order_date'
+    # Served by the order_date index, also within a date hierarchy range.
+    ordering = ('-order_date',)
+    autocomplete_fields = ('customer',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return DateHierarchyQuerySet(self.model, queryset.query.chain(), using=queryset.db)
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class StoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'store'
+
+    def ready(self):
+        from app.metrics import registry
+        from . import signals  # noqa: F401
+        from .cache import response_cache_metrics
+        registry.register_collector(response_cache_metrics)
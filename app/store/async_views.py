@@ -0,0 +1,129 @@
+"""
+Async-native versions of the catalogue read endpoints.
+
+Each view wraps one of the DRF catalogue views and reuses its queryset,
+filters, pagination and serializer, so both serve the same JSON, but reads
+through the async ORM, the async cache API and async pagination instead of
+tying up a thread per request under ASGI. The wrapped view's permissions,
+throttles and authentication apply as they do to the DRF view. Requests
+other than GET and HEAD are handed to the wrapped DRF view unchanged.
+
+They are routed under api/store/async/ and, with STORE_ASYNC_CATALOGUE set,
+replace the DRF views on the regular catalogue URLs.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.decorators import classonlymethod
+from django.utils.http import http_date
+from django.views import View
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .cache import aget_catalogue_generation, cached_not_modified, get_cache, response_cache_key, response_cache_stats
+from .conditional import list_etag, make_etag
+from .views import CategoryListCreateView, ProductDetailView, ProductListView
+
+
+class AsyncCatalogueView(View):
+    """Serve GETs of a cached, conditional DRF catalogue view with the async ORM."""
+    view_class = None
+    sync_view = None
+    renderer = JSONRenderer()
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(sync_view=cls.view_class.as_view(), **initkwargs)
+        # Like every DRF view; the wrapped view enforces CSRF itself for session authentication.
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+        drf_view = self.view_class(args=args, kwargs=kwargs, format_kwarg=None)
+        drf_view.request = Request(request, authenticators=drf_view.get_authenticators())
+        try:
+            # The DRF view's own checks: content negotiation, authentication,
+            # permissions and throttles. Its initial() also routes the read to
+            # the replica; authenticators and throttles use the sync APIs.
+            await sync_to_async(drf_view.initial)(drf_view.request, *args, **kwargs)
+            return await self.get(drf_view.request, drf_view)
+        except APIException as exc:
+            response = drf_view.handle_exception(exc)
+            headers = {header: value for header, value in response.items() if header != 'Content-Type'}
+            return self.render(response.data, status=response.status_code, headers=headers)
+
+    async def get(self, request, drf_view):
+        cache = get_cache()
+        generation = await aget_catalogue_generation()
+        key = response_cache_key(request, generation)
+        entry = await cache.aget(key)
+        if entry is not None:
+            response_cache_stats['hits'] += 1
+            data, headers = entry
+            not_modified = cached_not_modified(request, headers)
+            if not_modified is not None:
+                return not_modified
+            return self.render(data, headers={**headers, 'X-Cache': 'HIT'})
+
+        response_cache_stats['misses'] += 1
+        lookup_url_kwarg = drf_view.lookup_url_kwarg or drf_view.lookup_field
+        if lookup_url_kwarg in drf_view.kwargs:
+            result = await self.retrieve(request, drf_view, drf_view.kwargs[lookup_url_kwarg])
+        else:
+            result = await self.list(request, drf_view, generation)
+        if isinstance(result, HttpResponse):
+            return result
+
+        data, headers = result
+        await cache.aset(key, (data, headers), settings.STORE_RESPONSE_CACHE_TIMEOUT)
+        return self.render(data, headers={**headers, 'X-Cache': 'MISS'})
+
+    async def retrieve(self, request, drf_view, lookup):
+        """Return the serialized object and its validator headers, or a 304 response."""
+        instance = await drf_view.get_queryset().filter(**{drf_view.lookup_field: lookup}).afirst()
+        if instance is None:
+            raise NotFound()
+        etag = make_etag(request, instance.updated_at.isoformat())
+        not_modified = get_conditional_response(request, etag=etag, last_modified=int(instance.updated_at.timestamp()))
+        if not_modified is not None:
+            return not_modified
+        return drf_view.get_serializer(instance).data, {
+            'ETag': etag,
+            'Last-Modified': http_date(instance.updated_at.timestamp()),
+        }
+
+    async def list(self, request, drf_view, generation):
+        """Return the serialized page and its validator headers, or a 304 response."""
+        etag = list_etag(request, generation)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+
+        # django-filter validates choices such as a category id against the
+        # database while building the filter, which needs a sync context.
+        queryset = await sync_to_async(drf_view.filter_queryset)(drf_view.get_queryset())
+
+        paginator = drf_view.paginator
+        page = await paginator.apaginate_queryset(queryset, request, view=drf_view)
+        data = paginator.get_paginated_response(drf_view.get_serializer(page, many=True).data).data
+        return data, {'ETag': etag}
+
+    def render(self, data, status=200, headers=None):
+        return HttpResponse(self.renderer.render(data), status=status, headers=headers, content_type='application/json')
+
+
+class AsyncCategoryListView(AsyncCatalogueView):
+    view_class = CategoryListCreateView
+
+
+class AsyncProductListView(AsyncCatalogueView):
+    view_class = ProductListView
+
+
+class AsyncProductDetailView(AsyncCatalogueView):
+    view_class = ProductDetailView
@@ -0,0 +1,391 @@
+"""
+Benchmarks for the store API.
+
+Every scenario sends requests through the Django test client against a
+database seeded by store.seeding and reports, per request, latency
+percentiles, the number of queries and the memory allocated. A separate
+concurrency benchmark compares the WSGI and ASGI paths of the product list,
+a serializer benchmark the CPU cost of rendering a product list page and a
+connection benchmark what persistent database connections save per request.
+Run them with the bench_store management command.
+"""
+import asyncio
+import random
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, process_time
+from wsgiref.util import setup_testing_defaults
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+
+from user.models import User
+from .cache import get_cache
+from .models import Category, Product
+from .pagination import KeysetPagination
+from .seeding import ORDER_DATES_START
+from .serializers import ProductRowSerializer, ProductSerializer
+
+SCENARIOS = {}
+
+# Allocations are measured in a separate, shorter pass since tracing slows requests down.
+ALLOCATION_SAMPLES = 20
+
+
+def scenario(name, cached=False):
+    """Register a benchmark scenario.
+
+    A scenario receives the BenchmarkContext and returns a callable sending
+    the i-th request. Unless `cached` is set, the catalogue response cache is
+    cleared before every request so the database path is measured.
+    """
+    def register(func):
+        SCENARIOS[name] = (func, cached)
+        return func
+    return register
+
+
+class BenchmarkContext:
+    """Seeded data shared by all scenarios."""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.merchant = User.objects.filter(is_merchant=True).order_by('id').first()
+        self.customer = User.objects.filter(is_merchant=False, is_superuser=False).order_by('id').first()
+        self.product_ids = list(Product.objects.order_by('id').values_list('id', flat=True))
+        self.category_ids = list(Category.objects.order_by('id').values_list('id', flat=True))
+
+    def client(self, user=None):
+        if user is None:
+            return Client()
+        token, _ = Token.objects.get_or_create(user=user)
+        return Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+
+@scenario('product-list')
+def product_list(context):
+    client = context.client()
+    return lambda i: client.get(reverse('product-list'))
+
+
+@scenario('product-list-cached', cached=True)
+def product_list_cached(context):
+    client = context.client()
+    return lambda i: client.get(reverse('product-list'))
+
+
+@scenario('product-list-filtered')
+def product_list_filtered(context):
+    client = context.client()
+    return lambda i: client.get(reverse('product-list'), {
+        'category': context.category_ids[i % len(context.category_ids)],
+        'ordering': '-price',
+    })
+
+
+@scenario('product-list-deep-page')
+def product_list_deep_page(context):
+    client = context.client()
+    page = max(len(context.product_ids) // KeysetPagination.page_size // 2, 1)
+    return lambda i: client.get(reverse('product-list'), {'page': page})
+
+
+@scenario('product-list-async')
+def product_list_async(context):
+    client = context.client()
+    return lambda i: client.get(reverse('product-list-async'))
+
+
+@scenario('product-list-deep-cursor')
+def product_list_deep_cursor(context):
+    client = context.client()
+    middle = context.product_ids[len(context.product_ids) // 2]
+    cursor = KeysetPagination().encode_cursor([middle], False)
+    return lambda i: client.get(reverse('product-list'), {'cursor': cursor})
+
+
+@scenario('product-statistics')
+def product_statistics(context):
+    client = context.client(context.merchant)
+    date_from = ORDER_DATES_START.date().isoformat()
+    date_to = ORDER_DATES_START.date().replace(month=12, day=31).isoformat()
+    url = reverse('product-statistics', args=[date_from, date_to, 10])
+    return lambda i: client.get(url)
+
+
+@scenario('create-order')
+def create_order(context):
+    client = context.client(context.customer)
+
+    def request(i):
+        products = context.rng.sample(context.product_ids, min(5, len(context.product_ids)))
+        return client.post(reverse('create-order'), {
+            'delivery_address': 'Benchmark street 1',
+            'items': [{'product': product_id, 'quantity': 1} for product_id in products],
+        }, content_type='application/json')
+    return request
+
+
+@scenario('token-auth')
+def token_auth(context):
+    client = context.client(context.customer)
+    return lambda i: client.get(reverse('user:me'))
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of a sorted list."""
+    index = max(int(round(fraction * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def summarize(values, scale=1):
+    values = sorted(value * scale for value in values)
+    return {
+        'mean': round(sum(values) / len(values), 3),
+        'p50': round(percentile(values, 0.5), 3),
+        'p90': round(percentile(values, 0.9), 3),
+        'p99': round(percentile(values, 0.99), 3),
+        'max': round(values[-1], 3),
+    }
+
+
+def run_scenario(request, iterations, warmup, cached):
+    def send(i):
+        if not cached:
+            get_cache().clear()
+        return check_response(request(i))
+
+    for i in range(warmup):
+        send(i)
+
+    latencies, queries = [], []
+    for i in range(iterations):
+        with CaptureQueriesContext(connection) as captured:
+            start = perf_counter()
+            send(i)
+            latencies.append(perf_counter() - start)
+        queries.append(len(captured))
+
+    allocations = []
+    tracemalloc.start()
+    try:
+        for i in range(min(iterations, ALLOCATION_SAMPLES)):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            send(i)
+            allocations.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'requests': iterations,
+        'latency_ms': summarize(latencies, scale=1000),
+        'queries': summarize(queries),
+        'peak_allocated_kib': summarize(allocations, scale=1 / 1024),
+    }
+
+
+def run_wsgi_requests(path, concurrency, requests):
+    """Send requests through the WSGI handler from `concurrency` threads."""
+    def worker(count):
+        client = Client()
+        latencies = []
+        try:
+            for _ in range(count):
+                start = perf_counter()
+                check_response(client.get(path))
+                latencies.append(perf_counter() - start)
+        finally:
+            connection.close()
+        return latencies
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        start = perf_counter()
+        results = list(executor.map(worker, split(requests, concurrency)))
+        elapsed = perf_counter() - start
+    return [latency for latencies in results for latency in latencies], elapsed
+
+
+def run_asgi_requests(path, concurrency, requests):
+    """Send requests through the ASGI handler from `concurrency` tasks on one event loop."""
+    async def worker(count):
+        client = AsyncClient()
+        latencies = []
+        for _ in range(count):
+            start = perf_counter()
+            check_response(await client.get(path))
+            latencies.append(perf_counter() - start)
+        return latencies
+
+    async def main():
+        start = perf_counter()
+        results = await asyncio.gather(*(worker(count) for count in split(requests, concurrency)))
+        return [latency for latencies in results for latency in latencies], perf_counter() - start
+
+    return asyncio.run(main())
+
+
+CONCURRENCY_MODES = {
+    # mode: (request runner, URL name)
+    'wsgi': (run_wsgi_requests, 'product-list'),
+    'asgi-sync-view': (run_asgi_requests, 'product-list'),
+    'asgi-async-view': (run_asgi_requests, 'product-list-async'),
+}
+
+
+def run_concurrency_benchmarks(levels=(1, 8, 32), requests=200):
+    """Compare how the product list scales with concurrent clients under WSGI and ASGI.
+
+    The response cache is bypassed so every request reaches the database.
+    Clients run in process, so the numbers show the handler and view overhead
+    rather than that of a particular server.
+    """
+    results = {}
+    with override_settings(STORE_RESPONSE_CACHE_TIMEOUT=0):
+        for mode, (run, url_name) in CONCURRENCY_MODES.items():
+            path = reverse(url_name)
+            run(path, 1, min(requests, 10))
+            results[mode] = {}
+            for level in levels:
+                latencies, elapsed = run(path, level, requests)
+                results[mode][str(level)] = {
+                    'requests_per_second': round(len(latencies) / elapsed, 1),
+                    'latency_ms': summarize(latencies, scale=1000),
+                }
+    return results
+
+
+CONNECTION_MODES = {
+    # mode: (CONN_MAX_AGE, CONN_HEALTH_CHECKS)
+    'per-request': (0, False),
+    'persistent': (60, False),
+    'persistent-health-checks': (60, True),
+}
+
+
+def send_wsgi_request(handler, path):
+    """Send a GET through the WSGI handler and close the response like a server would.
+
+    Unlike the test client, this lets the request_started and
+    request_finished signals close or keep the database connection.
+    """
+    environ = {'PATH_INFO': path, 'HTTP_HOST': 'testserver'}
+    setup_testing_defaults(environ)
+    response = handler(environ, lambda status, headers, exc_info=None: None)
+    try:
+        b''.join(response)
+    finally:
+        response.close()
+    return check_response(response)
+
+
+def run_connection_benchmark(requests=200):
+    """Compare product detail latency with a connection per request and with persistent connections.
+
+    The response cache is bypassed so every request reaches the database.
+    `connections_opened` counts the connections set up during the measured
+    requests, including the pragmas of app.db on SQLite.
+    """
+    handler = WSGIHandler()
+    path = reverse('product-detail', args=[Product.objects.order_by('id').values_list('id', flat=True).first()])
+    settings_dict = connection.settings_dict
+    saved = settings_dict['CONN_MAX_AGE'], settings_dict['CONN_HEALTH_CHECKS']
+    opened = []
+
+    def count_connection(sender, connection, **kwargs):
+        opened.append(connection.alias)
+
+    connection_created.connect(count_connection)
+    results = {}
+    try:
+        with override_settings(STORE_RESPONSE_CACHE_TIMEOUT=0):
+            for mode, (max_age, health_checks) in CONNECTION_MODES.items():
+                settings_dict['CONN_MAX_AGE'], settings_dict['CONN_HEALTH_CHECKS'] = max_age, health_checks
+                connection.close()
+                for _ in range(min(requests, 10)):
+                    send_wsgi_request(handler, path)
+                opened.clear()
+                latencies = []
+                for _ in range(requests):
+                    start = perf_counter()
+                    send_wsgi_request(handler, path)
+                    latencies.append(perf_counter() - start)
+                results[mode] = {
+                    'latency_ms': summarize(latencies, scale=1000),
+                    'connections_opened': len(opened),
+                }
+    finally:
+        connection_created.disconnect(count_connection)
+        settings_dict['CONN_MAX_AGE'], settings_dict['CONN_HEALTH_CHECKS'] = saved
+        connection.close()
+    return results
+
+
+def run_serializer_benchmark(page_size=KeysetPagination.page_size, iterations=200):
+    """Compare the CPU time ProductSerializer and ProductRowSerializer spend on a product list page.
+
+    `serialize` times rendering alone, `fetch_and_serialize` includes reading
+    the page as model instances or as value rows.
+    """
+    request = Request(RequestFactory().get(reverse('product-list')))
+    context = {'request': request}
+    instances = Product.objects.order_by('id')[:page_size]
+    rows = Product.objects.order_by('id').values(*ProductRowSerializer.value_fields)[:page_size]
+    page_instances, page_rows = list(instances), list(rows)
+
+    variants = {
+        'serialize': (
+            lambda: ProductSerializer(page_instances, many=True, context=context).data,
+            lambda: ProductRowSerializer(page_rows, many=True, context=context).data,
+        ),
+        'fetch_and_serialize': (
+            lambda: ProductSerializer(list(instances.all()), many=True, context=context).data,
+            lambda: ProductRowSerializer(list(rows.all()), many=True, context=context).data,
+        ),
+    }
+    results = {}
+    for name, (model_serializer, row_serializer) in variants.items():
+        model_ms, row_ms = cpu_time_ms(model_serializer, iterations), cpu_time_ms(row_serializer, iterations)
+        results[name] = {
+            'model_serializer_ms': round(model_ms, 3),
+            'row_serializer_ms': round(row_ms, 3),
+            'speedup': round(model_ms / row_ms, 1),
+        }
+    return results
+
+
+def cpu_time_ms(func, iterations):
+    """Return the mean CPU time of func() in milliseconds."""
+    for _ in range(min(iterations, 10)):
+        func()
+    start = process_time()
+    for _ in range(iterations):
+        func()
+    return (process_time() - start) / iterations * 1000
+
+
+def split(total, parts):
+    """Split `total` into `parts` near-equal counts."""
+    return [total // parts + (index < total % parts) for index in range(parts)]
+
+
+def check_response(response):
+    if response.status_code >= 400:
+        raise RuntimeError(f'Benchmark request failed with status {response.status_code}: {response.content[:200]!r}')
+    return response
+
+
+def run_benchmarks(names=None, iterations=100, warmup=5, seed=0):
+    """Run the named scenarios (all by default) and return their results."""
+    context = BenchmarkContext(seed=seed)
+    results = {}
+    for name in names or sorted(SCENARIOS):
+        func, cached = SCENARIOS[name]
+        results[name] = run_scenario(func(context), iterations, warmup, cached)
+    return results
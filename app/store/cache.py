@@ -0,0 +1,124 @@
+import time
+from collections import Counter
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+CATALOGUE_GENERATION_KEY = 'store:catalogue:generation'
+
+# Per-process hit/miss counters of the catalogue response cache.
+response_cache_stats = Counter()
+
+
+def response_cache_metrics():
+    """Export response_cache_stats through app.metrics."""
+    return [(
+        'store_response_cache_lookups_total',
+        'Catalogue response cache lookups by result.',
+        'counter',
+        {(('result', 'hit'),): response_cache_stats['hits'], (('result', 'miss'),): response_cache_stats['misses']},
+    )]
+
+
+def get_cache():
+    return caches[settings.STORE_RESPONSE_CACHE_ALIAS]
+
+
+def get_catalogue_generation():
+    """Return the current catalogue generation, part of every response cache key."""
+    # A fresh generation starts from the clock, so it never repeats one whose
+    # entries might still be cached after the counter itself was evicted.
+    return get_cache().get_or_set(CATALOGUE_GENERATION_KEY, time.time_ns, None)
+
+
+async def aget_catalogue_generation():
+    return await get_cache().aget_or_set(CATALOGUE_GENERATION_KEY, time.time_ns, None)
+
+
+def bump_catalogue_generation():
+    """Invalidate every cached catalogue response."""
+    cache = get_cache()
+    try:
+        cache.incr(CATALOGUE_GENERATION_KEY)
+    except ValueError:
+        cache.set(CATALOGUE_GENERATION_KEY, time.time_ns(), None)
+
+
+def catalogue_changed():
+    """Invalidate cached catalogue responses now and once more after commit.
+
+    The second bump discards anything a concurrent reader cached from the
+    pre-commit state in between.
+    """
+    bump_catalogue_generation()
+    transaction.on_commit(bump_catalogue_generation)
+
+
+def dashboard_cache_key(merchant_id, today):
+    return f'store:dashboard:{merchant_id}:{today.isoformat()}'
+
+
+def invalidate_dashboards(merchant_ids):
+    """Drop today's cached dashboards of the given merchants."""
+    today = timezone.localdate()
+    get_cache().delete_many([dashboard_cache_key(merchant_id, today) for merchant_id in merchant_ids])
+
+
+def normalized_url(request):
+    """Return the request URL with sorted, non-empty query parameters."""
+    params = sorted((key, value) for key, values in request.query_params.lists() for value in values if value)
+    return f'{request.get_host()}{request.path}?{urlencode(params)}'
+
+
+def response_cache_key(request, generation=None):
+    if generation is None:
+        generation = get_catalogue_generation()
+    url = normalized_url(request)
+    return f'store:response:{generation}:{md5(url.encode()).hexdigest()}'
+
+
+def cached_not_modified(request, headers):
+    """Return a 304 response if the cached validator headers match the request."""
+    return get_conditional_response(
+        request,
+        etag=headers.get('ETag'),
+        last_modified=parse_http_date_safe(headers.get('Last-Modified')),
+    )
+
+
+class CachedResponseMixin:
+    """Serve GET responses of a catalogue view from the response cache.
+
+    Entries are keyed on host, path and normalized query parameters under the
+    current catalogue generation, which Product and Category changes bump.
+    Validator headers are cached along with the data, so conditional requests
+    are answered from the cache as well.
+    """
+    cached_headers = ('ETag', 'Last-Modified')
+
+    def get(self, request, *args, **kwargs):
+        cache = get_cache()
+        key = response_cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            response_cache_stats['hits'] += 1
+            data, headers = entry
+            not_modified = cached_not_modified(request, headers)
+            if not_modified is not None:
+                return not_modified
+            return Response(data, headers={**headers, 'X-Cache': 'HIT'})
+
+        response_cache_stats['misses'] += 1
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            headers = {header: response[header] for header in self.cached_headers if response.has_header(header)}
+            cache.set(key, (response.data, headers), settings.STORE_RESPONSE_CACHE_TIMEOUT)
+            response['X-Cache'] = 'MISS'
+        return response
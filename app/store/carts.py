@@ -0,0 +1,179 @@
+"""
+Shopping carts kept in the cache.
+
+A cart maps product ids to quantities and lives under one cache key per
+user, as a native hash on Redis and as a single dict entry on other cache
+backends, so every cart operation is a constant number of cache round trips
+and nothing touches the database until checkout. Prices are not stored:
+they are read for the whole cart at once whenever it is shown or checked
+out.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+
+from .models import Order, Product
+
+
+class CartFull(Exception):
+    """Raised when adding a product would exceed STORE_CART_MAX_ITEMS."""
+
+
+class CacheCart:
+    """A user's cart stored as a single {product id: quantity} cache entry.
+
+    Works with any cache backend. Concurrent updates of the same cart may
+    overwrite each other, which RedisCart avoids.
+    """
+
+    def __init__(self, cache, user_id):
+        self.cache = cache
+        self.key = f'store:cart:{user_id}'
+        self.timeout = settings.STORE_CART_TIMEOUT
+
+    def items(self):
+        return self.cache.get(self.key, {})
+
+    def add(self, product_id, quantity):
+        """Add to a product's quantity and return the new quantity."""
+        items = self.items()
+        if product_id not in items and len(items) >= settings.STORE_CART_MAX_ITEMS:
+            raise CartFull
+        items[product_id] = items.get(product_id, 0) + quantity
+        self.cache.set(self.key, items, self.timeout)
+        return items[product_id]
+
+    def set(self, product_id, quantity):
+        """Set a product's quantity; zero removes the product."""
+        items = self.items()
+        if quantity <= 0:
+            items.pop(product_id, None)
+        elif product_id not in items and len(items) >= settings.STORE_CART_MAX_ITEMS:
+            raise CartFull
+        else:
+            items[product_id] = quantity
+        self.cache.set(self.key, items, self.timeout)
+
+    def remove(self, product_id):
+        self.set(product_id, 0)
+
+    def clear(self):
+        self.cache.delete(self.key)
+
+    def take(self):
+        """Remove and return all items, so a cart is checked out only once."""
+        items = self.items()
+        self.cache.delete(self.key)
+        return items
+
+    def restore(self, items):
+        """Put back items returned by take(), e.g. after a failed checkout."""
+        for product_id, quantity in items.items():
+            self.add(product_id, quantity)
+
+
+class RedisCart(CacheCart):
+    """A user's cart stored as a Redis hash of product id to quantity.
+
+    Every operation is atomic, so concurrent updates of the same cart are not
+    lost. Adding a product runs as an optimistic WATCH/MULTI transaction,
+    retried if the cart changes in between, so concurrent adds cannot take
+    it past STORE_CART_MAX_ITEMS.
+    """
+
+    def __init__(self, cache, user_id):
+        super().__init__(cache, user_id)
+        self.key = cache.make_and_validate_key(self.key)
+        self.client = cache._cache.get_client(self.key, write=True)
+
+    def items(self):
+        return {int(product_id): int(quantity) for product_id, quantity in self.client.hgetall(self.key).items()}
+
+    def check_room(self, pipeline, product_id):
+        """Raise CartFull if the watched cart has no room for a new product."""
+        if not pipeline.hexists(self.key, product_id) and pipeline.hlen(self.key) >= settings.STORE_CART_MAX_ITEMS:
+            raise CartFull
+
+    def add(self, product_id, quantity):
+        def add(pipeline):
+            self.check_room(pipeline, product_id)
+            pipeline.multi()
+            pipeline.hincrby(self.key, product_id, quantity).expire(self.key, self.timeout)
+
+        return self.client.transaction(add, self.key)[0]
+
+    def set(self, product_id, quantity):
+        if quantity <= 0:
+            self.client.hdel(self.key, product_id)
+            return
+
+        def set(pipeline):
+            self.check_room(pipeline, product_id)
+            pipeline.multi()
+            pipeline.hset(self.key, product_id, quantity).expire(self.key, self.timeout)
+
+        self.client.transaction(set, self.key)
+
+    def clear(self):
+        self.client.delete(self.key)
+
+    def take(self):
+        pipeline = self.client.pipeline()
+        items, _ = pipeline.hgetall(self.key).delete(self.key).execute()
+        return {int(product_id): int(quantity) for product_id, quantity in items.items()}
+
+
+def get_cart(user):
+    cache = caches[settings.STORE_CART_CACHE_ALIAS]
+    cart_class = RedisCart if isinstance(cache, RedisCache) else CacheCart
+    return cart_class(cache, user.pk)
+
+
+def cart_contents(cart):
+    """Return the cart's lines with current prices, read in one query.
+
+    Products deleted since they were added are dropped from the cart.
+    """
+    items = cart.items()
+    products = Product.objects.filter(pk__in=items).order_by('pk').values('id', 'name', 'price')
+    lines = []
+    for product in products:
+        quantity = items.pop(product['id'])
+        lines.append({
+            'product': product['id'],
+            'name': product['name'],
+            'price': product['price'],
+            'quantity': quantity,
+            'line_total': product['price'] * quantity,
+        })
+    for product_id in items:
+        cart.remove(product_id)
+    return {
+        'items': lines,
+        'item_count': sum(line['quantity'] for line in lines),
+        'total_price': sum((line['line_total'] for line in lines), Decimal('0.00')),
+    }
+
+
+def checkout(cart, customer, **order_fields):
+    """Turn the cart into an order, or return None when the cart is empty.
+
+    Products are read in one query and the order is written by
+    OrderManager.create_with_items in a single transaction. The cart is
+    emptied up front and restored if the order cannot be created.
+    """
+    items = cart.take()
+    products = Product.objects.only('id', 'price', 'merchant').in_bulk(items)
+    if not products:
+        return None
+    try:
+        return Order.objects.create_with_items(
+            customer,
+            [(products[product_id], quantity) for product_id, quantity in items.items() if product_id in products],
+            **order_fields
+        )
+    except Exception:
+        cart.restore(items)
+        raise
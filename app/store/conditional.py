@@ -0,0 +1,58 @@
+from hashlib import md5
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .cache import get_catalogue_generation, normalized_url
+
+
+def make_etag(request, *state):
+    """Return a strong ETag for the request URL and the given database state."""
+    payload = '|'.join([normalized_url(request), *map(str, state)])
+    return f'"{md5(payload.encode()).hexdigest()}"'
+
+
+def list_etag(request, generation):
+    """Return the ETag of a list response under the given catalogue generation."""
+    return make_etag(request, 'list', generation)
+
+
+class ConditionalGetMixin:
+    """Answer conditional GETs from `updated_at` before serializing anything.
+
+    Detail responses are validated by the object's `updated_at`. Lists are
+    validated by the catalogue generation of store.cache, which every product
+    and category change bumps, deletions included, so a list validator costs
+    no query at all. Lists carry no Last-Modified header since a generation
+    is not a timestamp.
+    """
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request, *args, **kwargs)
+        not_modified = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified and int(last_modified.timestamp()),
+        )
+        if not_modified is not None:
+            return not_modified
+
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            if etag:
+                response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
+
+    def get_validators(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg in kwargs:
+            last_modified = self.get_queryset().filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            ).values_list('updated_at', flat=True).first()
+            if last_modified is None:
+                return None, None
+            return make_etag(request, last_modified.isoformat()), last_modified
+
+        return list_etag(request, get_catalogue_generation()), None
@@ -0,0 +1,99 @@
+"""
+Merchant dashboard figures.
+
+For each of STORE_DASHBOARD_WINDOWS, the last N days up to and including
+today, the dashboard shows orders, units and revenue, the top products by
+revenue and a zero-filled daily series. Everything is read from the sales
+rollups in two queries, however many windows there are: the merchant
+rollup rows of the longest window, from which the series and totals are
+summed, and one conditional aggregation over the product rollup with a
+units and revenue sum per window.
+
+Dashboards are cached per merchant and day and dropped once the merchant
+gets an order, see MerchantDailySalesManager.add_sales.
+"""
+import heapq
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .cache import dashboard_cache_key, get_cache
+from .models import MerchantDailySales, ProductDailySales
+from .serializers import MerchantDashboardSerializer
+
+
+def daily_series(merchant_id, date_from, date_to):
+    """Return the merchant's {day: totals} from date_from to date_to, zero-filled."""
+    days = {
+        date_from + timedelta(days=offset): {'day': date_from + timedelta(days=offset), 'orders': 0, 'units': 0, 'revenue': Decimal('0.00')}
+        for offset in range((date_to - date_from).days + 1)
+    }
+    rows = MerchantDailySales.objects.filter(
+        merchant_id=merchant_id, day__range=(date_from, date_to),
+    ).values('day', 'orders', 'units', 'revenue')
+    for row in rows:
+        days[row['day']] = row
+    return days
+
+
+def product_sales(merchant_id, starts, date_to):
+    """Return the merchant's product sales with units_<n> and revenue_<n> per window start."""
+    return ProductDailySales.objects.filter(
+        merchant_id=merchant_id, day__range=(min(starts.values()), date_to),
+    ).values('product_id', 'product__name').annotate(**{
+        f'{measure}_{days}': Sum(measure, filter=Q(day__gte=start))
+        for days, start in starts.items() for measure in ('units', 'revenue')
+    }).order_by()
+
+
+def build_dashboard(merchant_id, today=None, windows=None, top_products=None):
+    """Compute the dashboard of a merchant from the sales rollups."""
+    today = today or timezone.localdate()
+    windows = sorted(windows or settings.STORE_DASHBOARD_WINDOWS)
+    top_products = top_products or settings.STORE_DASHBOARD_TOP_PRODUCTS
+    starts = {days: today - timedelta(days=days - 1) for days in windows}
+
+    series = list(daily_series(merchant_id, starts[windows[-1]], today).values())
+    products = list(product_sales(merchant_id, starts, today))
+
+    dashboard = {'date': today, 'windows': []}
+    for days in windows:
+        daily = series[-days:]
+        sold = [product for product in products if product[f'units_{days}']]
+        top = heapq.nlargest(
+            top_products, sold,
+            key=lambda product: (product[f'revenue_{days}'], product[f'units_{days}'], -product['product_id']),
+        )
+        dashboard['windows'].append({
+            'days': days,
+            'date_from': starts[days],
+            'date_to': today,
+            'orders': sum(day['orders'] for day in daily),
+            'units': sum(day['units'] for day in daily),
+            'revenue': sum((day['revenue'] for day in daily), Decimal('0.00')),
+            'top_products': [
+                {
+                    'product': product['product_id'],
+                    'name': product['product__name'],
+                    'units': product[f'units_{days}'],
+                    'revenue': product[f'revenue_{days}'],
+                }
+                for product in top
+            ],
+            'daily': daily,
+        })
+    return dashboard
+
+
+def get_dashboard(merchant_id):
+    """Return the serialized dashboard of a merchant, from the cache when possible."""
+    cache = get_cache()
+    key = dashboard_cache_key(merchant_id, timezone.localdate())
+    data = cache.get(key)
+    if data is None:
+        data = MerchantDashboardSerializer(build_dashboard(merchant_id)).data
+        cache.set(key, data, settings.STORE_DASHBOARD_CACHE_TIMEOUT)
+    return data
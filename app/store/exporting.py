@@ -0,0 +1,100 @@
+"""
+Streaming export of a merchant's order lines.
+
+Rows are read with values_list() and iterator(), so neither model instances
+nor the whole result set are held in memory, and written out in batches as
+CSV or NDJSON while the query is still being read.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from .models import OrderItem
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+EXPORT_CHUNK_SIZE = 2000
+
+# (column, lookup) pairs; line_total is computed from quantity and unit_price.
+EXPORT_COLUMNS = (
+    ('order_id', 'order_id'),
+    ('order_date', 'order__order_date'),
+    ('is_paid', 'order__is_paid'),
+    ('delivery_address', 'order__delivery_address'),
+    ('product_id', 'product_id'),
+    ('sku', 'product__sku'),
+    ('product_name', 'product__name'),
+    ('quantity', 'quantity'),
+    ('unit_price', 'unit_price'),
+)
+EXPORT_HEADER = [column for column, _ in EXPORT_COLUMNS] + ['line_total']
+
+
+class Echo:
+    """File-like object handing back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def date_range_bounds(date_from, date_to):
+    """Return aware datetimes covering the whole days from date_from to date_to."""
+    start = timezone.make_aware(datetime.combine(date_from, time.min))
+    end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+    return start, end
+
+
+def export_queryset(merchant, date_from, date_to):
+    """Return the merchant's order lines between two dates as value tuples."""
+    start, end = date_range_bounds(date_from, date_to)
+    return OrderItem.objects.filter(
+        product__merchant=merchant,
+        order__order_date__gte=start,
+        order__order_date__lt=end,
+    ).order_by('order_id', 'id').values_list(*(lookup for _, lookup in EXPORT_COLUMNS))
+
+
+def export_rows(merchant, date_from, date_to, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the merchant's order lines between two dates as tuples in EXPORT_HEADER order."""
+    for row in export_queryset(merchant, date_from, date_to).iterator(chunk_size=chunk_size):
+        quantity, unit_price = row[-2:]
+        yield (*row, quantity * unit_price)
+
+
+def batched(lines, size):
+    """Join consecutive lines so each streamed chunk carries many rows."""
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield ''.join(batch)
+            batch = []
+    if batch:
+        yield ''.join(batch)
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_HEADER, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def export_order_lines(merchant, date_from, date_to, file_format='csv', chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the merchant's order lines between two dates as chunks of CSV or NDJSON text."""
+    write = csv_lines if file_format == 'csv' else ndjson_lines
+    lines = write(export_rows(merchant, date_from, date_to, chunk_size))
+    if file_format == 'csv':
+        # Send the header right away, before the first chunk of rows is read.
+        yield next(lines)
+    yield from batched(lines, chunk_size)
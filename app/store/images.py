@@ -0,0 +1,65 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image
+
+RENDITION_DIRECTORY = 'product_renditions'
+
+# File extension used for each Pillow output format.
+FORMAT_EXTENSIONS = {
+    'JPEG': 'jpg',
+    'WEBP': 'webp',
+    'PNG': 'png',
+}
+
+
+def rendition_key(width, image_format):
+    return f'{width}.{FORMAT_EXTENSIONS[image_format]}'
+
+
+def rendition_name(image_name, width, image_format):
+    base = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{RENDITION_DIRECTORY}/{base}_{width}.{FORMAT_EXTENSIONS[image_format]}'
+
+
+def generate_renditions(image):
+    """Write every configured rendition of an image field file to its storage.
+
+    Returns a mapping of rendition key (e.g. `400.webp`) to storage name.
+    Names are derived from the source image, so running this again overwrites
+    the previous renditions instead of adding new files. Images are never
+    upscaled.
+    """
+    widths = sorted(settings.PRODUCT_IMAGE_RENDITION_WIDTHS, reverse=True)
+    formats = settings.PRODUCT_IMAGE_RENDITION_FORMATS
+    storage = image.storage
+
+    with image.open('rb'):
+        img = Image.open(image)
+        if img.format == 'JPEG':
+            # Let the decoder downscale by a power of two while reading, which
+            # is much cheaper than decoding the full upload and resizing.
+            img.draft('RGB', (widths[0], max(1, widths[0] * img.height // img.width)))
+        img.load()
+
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+
+    renditions = {}
+    for width in widths:
+        # Each size is resized from the previous, larger one.
+        if img.width > width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.Resampling.LANCZOS)
+        for image_format in formats:
+            output = img.convert('RGB') if image_format == 'JPEG' and img.mode != 'RGB' else img
+            buffer = BytesIO()
+            output.save(buffer, image_format, quality=settings.PRODUCT_IMAGE_RENDITION_QUALITY)
+
+            name = rendition_name(image.name, width, image_format)
+            if storage.exists(name):
+                storage.delete(name)
+            renditions[rendition_key(width, image_format)] = storage.save(name, ContentFile(buffer.getvalue()))
+
+    return renditions
@@ -0,0 +1,173 @@
+"""
+Bulk product import for merchants.
+
+Rows are read one at a time from a CSV or NDJSON byte stream, validated and
+upserted in chunks keyed on the merchant's SKU, so memory use depends on the
+chunk size and not on the size of the file.
+"""
+import codecs
+import csv
+import json
+from functools import partial
+from itertools import islice
+
+from django.db import transaction
+from rest_framework import serializers
+
+from .cache import catalogue_changed
+from .models import Category, Product
+from .search import get_search_backend
+from .tasks import enqueue, generate_product_renditions_batch
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+IMPORT_CHUNK_SIZE = 1000
+# Rows failing beyond this are only counted, to keep the report bounded.
+MAX_REPORTED_ERRORS = 1000
+UPDATE_FIELDS = ['name', 'description', 'price', 'category', 'updated_at']
+# Only updated from rows that have an image, so uploads without the column keep existing images.
+IMAGE_UPDATE_FIELDS = UPDATE_FIELDS + ['image']
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    sku = serializers.CharField(max_length=64)
+    name = serializers.CharField(max_length=255)
+    description = serializers.CharField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    category = serializers.CharField(max_length=255, help_text='Category name.')
+    image = serializers.CharField(
+        max_length=100, required=False, allow_blank=True,
+        help_text='Storage name of an image that has already been uploaded.',
+    )
+
+
+def import_format(name):
+    """Guess the import format from a file name or content type."""
+    if name and ('ndjson' in name or name.endswith('.jsonl')):
+        return 'ndjson'
+    return 'csv'
+
+
+def read_rows(lines, file_format):
+    """Yield (row number, row) from an iterable of byte lines.
+
+    A row is a dict, or a ValueError when the line cannot be parsed.
+    """
+    text_lines = codecs.iterdecode(lines, 'utf-8-sig')
+    if file_format == 'csv':
+        reader = csv.DictReader(text_lines)
+        for number, row in enumerate(reader, start=1):
+            yield number, row
+        return
+
+    for number, line in enumerate(text_lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            yield number, ValueError(f'Invalid JSON: {error}')
+            continue
+        yield number, row if isinstance(row, dict) else ValueError('Each line must be a JSON object.')
+
+
+class ProductImport:
+    """Upsert rows of a merchant's catalogue and collect a per-row error report."""
+
+    def __init__(self, merchant, chunk_size=IMPORT_CHUNK_SIZE):
+        self.merchant = merchant
+        self.chunk_size = chunk_size
+        self.categories = dict(Category.objects.values_list('name', 'id'))
+        self.processed = 0
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []
+
+    def run(self, rows):
+        rows = iter(rows)
+        while chunk := list(islice(rows, self.chunk_size)):
+            self.import_chunk(chunk)
+        if self.imported:
+            catalogue_changed()
+        return self.report()
+
+    def report(self):
+        return {
+            'processed': self.processed,
+            'imported': self.imported,
+            'failed': self.error_count,
+            'errors': self.errors,
+        }
+
+    def add_error(self, number, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': number, 'errors': errors})
+
+    def validate(self, number, row):
+        """Return the row's product and whether the row sets its image, or None when invalid."""
+        if isinstance(row, Exception):
+            self.add_error(number, {'non_field_errors': [str(row)]})
+            return None
+        serializer = ProductImportRowSerializer(data=row)
+        if not serializer.is_valid():
+            self.add_error(number, serializer.errors)
+            return None
+        data = serializer.validated_data
+        category_id = self.categories.get(data['category'])
+        if category_id is None:
+            self.add_error(number, {'category': [f'Unknown category "{data["category"]}".']})
+            return None
+        return Product(
+            merchant=self.merchant,
+            sku=data['sku'],
+            name=data['name'],
+            description=data['description'],
+            price=data['price'],
+            category_id=category_id,
+            image=data.get('image', ''),
+        ), 'image' in data
+
+    def import_chunk(self, chunk):
+        self.processed += len(chunk)
+        # Later rows win over earlier rows with the same SKU.
+        products, with_image = {}, set()
+        for number, row in chunk:
+            validated = self.validate(number, row)
+            if validated is None:
+                continue
+            product, has_image = validated
+            products[product.sku] = product
+            if has_image:
+                with_image.add(product.sku)
+            else:
+                with_image.discard(product.sku)
+        if not products:
+            return
+
+        with transaction.atomic():
+            previous_images = dict(self.merchant.products.filter(sku__in=products).values_list('sku', 'image'))
+            for has_image, update_fields in ((False, UPDATE_FIELDS), (True, IMAGE_UPDATE_FIELDS)):
+                group = [product for sku, product in products.items() if (sku in with_image) == has_image]
+                if group:
+                    Product.objects.bulk_create(
+                        group,
+                        update_conflicts=True,
+                        unique_fields=['merchant', 'sku'],
+                        update_fields=update_fields,
+                    )
+            # Bulk upserts bypass model signals, so the search index is updated here.
+            imported = list(self.merchant.products.filter(sku__in=products).values_list('id', 'sku', 'name', 'description'))
+            get_search_backend().index([(product_id, name, description) for product_id, _, name, description in imported])
+
+            changed_images = [
+                product_id for product_id, sku, _, _ in imported
+                if sku in with_image and products[sku].image and products[sku].image != previous_images.get(sku)
+            ]
+            if changed_images:
+                transaction.on_commit(partial(enqueue, generate_product_renditions_batch, changed_images))
+        self.imported += len(imported)
+
+
+def import_products(merchant, lines, file_format='csv', chunk_size=IMPORT_CHUNK_SIZE):
+    """Import a merchant's products from an iterable of CSV or NDJSON byte lines."""
+    return ProductImport(merchant, chunk_size).run(read_rows(lines, file_format))
@@ -0,0 +1,98 @@
+import json
+import os
+import platform
+import sqlite3
+import tempfile
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from app.celery import app as celery_app
+from store.benchmarks import (
+    SCENARIOS, run_benchmarks, run_concurrency_benchmarks, run_connection_benchmark, run_serializer_benchmark,
+)
+from store.seeding import seed_store
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark the store API against a freshly seeded, temporary SQLite database '
+        'and report latency percentiles, queries and allocations per request as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=sorted(SCENARIOS),
+                            help='Scenario to run, may be repeated. Defaults to all.')
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+        parser.add_argument('--customers', type=int, default=200)
+        parser.add_argument('--merchants', type=int, default=20)
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--orders', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--concurrency', type=int, nargs='*', default=[1, 8, 32],
+                            help='Concurrent client counts for the WSGI/ASGI comparison; pass none to skip it.')
+        parser.add_argument('--concurrency-requests', type=int, default=200,
+                            help='Requests per concurrency level and mode.')
+        parser.add_argument('--connection-requests', type=int, default=200,
+                            help='Requests per connection mode; pass 0 to skip the connection benchmark.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Benchmarks run against a temporary SQLite database only.')
+
+        setup_test_environment(debug=False)
+        # Enqueued post-checkout tasks go to an in-memory broker nobody consumes.
+        celery_app.conf.broker_url = 'memory://'
+
+        with tempfile.TemporaryDirectory() as directory:
+            connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                seeded = seed_store(
+                    customers=options['customers'],
+                    merchants=options['merchants'],
+                    products=options['products'],
+                    orders=options['orders'],
+                    seed=options['seed'],
+                )
+                results = run_benchmarks(
+                    options['scenarios'],
+                    iterations=options['iterations'],
+                    warmup=options['warmup'],
+                    seed=options['seed'],
+                )
+                serializers = run_serializer_benchmark()
+                connections = options['connection_requests'] and run_connection_benchmark(
+                    options['connection_requests'],
+                )
+                concurrency = options['concurrency'] and run_concurrency_benchmarks(
+                    options['concurrency'],
+                    requests=options['concurrency_requests'],
+                )
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        report = json.dumps({
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': sqlite3.sqlite_version,
+            },
+            'options': {key: options[key] for key in ('iterations', 'warmup', 'seed')},
+            'seeded': seeded,
+            'scenarios': results,
+            'serializers': serializers,
+            'concurrency': concurrency or {},
+            'connections': connections or {},
+        }, indent=2, sort_keys=True)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,45 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.exporting import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, export_order_lines
+from user.models import User
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Invalid date "{value}", use YYYY-MM-DD.')
+
+
+class Command(BaseCommand):
+    help = "Export a merchant's order lines between two dates as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('merchant', help='Email of the merchant whose order lines are exported.')
+        parser.add_argument('date_from', type=parse_date, help='First day, YYYY-MM-DD.')
+        parser.add_argument('date_to', type=parse_date, help='Last day, YYYY-MM-DD.')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', help='Write to this file instead of stdout.')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            merchant = User.objects.get(email=options['merchant'], is_merchant=True)
+        except User.DoesNotExist:
+            raise CommandError(f'Merchant "{options["merchant"]}" does not exist.')
+
+        chunks = export_order_lines(
+            merchant,
+            options['date_from'],
+            options['date_to'],
+            file_format=options['format'],
+            chunk_size=options['chunk_size'],
+        )
+        if options['output']:
+            with open(options['output'], 'w', newline='') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
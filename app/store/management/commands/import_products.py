@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.importing import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, import_format, import_products
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = "Create or update a merchant's products from a CSV or NDJSON file, keyed on SKU."
+
+    def add_arguments(self, parser):
+        parser.add_argument('merchant', help='Email of the merchant owning the products.')
+        parser.add_argument('path', help='CSV or NDJSON file to import.')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='Defaults to a guess from the file name.')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            merchant = User.objects.get(email=options['merchant'], is_merchant=True)
+        except User.DoesNotExist:
+            raise CommandError(f'Merchant "{options["merchant"]}" does not exist.')
+
+        with open(options['path'], 'rb') as lines:
+            report = import_products(
+                merchant,
+                lines,
+                file_format=options['format'] or import_format(options['path']),
+                chunk_size=options['chunk_size'],
+            )
+
+        for error in report['errors']:
+            self.stderr.write(f'Row {error["row"]}: {error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {report["processed"]} rows: {report["imported"]} imported, {report["failed"]} failed.'
+        ))
@@ -0,0 +1,84 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from store.cache import invalidate_dashboards
+from store.models import MerchantDailySales, OrderItem, ProductDailySales
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product and merchant daily sales rollups from order items.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', help='First day to rebuild (YYYY-MM-DD). Defaults to the first order.')
+        parser.add_argument('--date-to', help='Last day to rebuild (YYYY-MM-DD). Defaults to the last order.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            date_from = options['date_from'] and datetime.strptime(options['date_from'], '%Y-%m-%d').date()
+            date_to = options['date_to'] and datetime.strptime(options['date_to'], '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError('Use YYYY-MM-DD for dates.')
+
+        rollup = ProductDailySales.objects.all()
+        merchant_rollup = MerchantDailySales.objects.all()
+        items = OrderItem.objects.annotate(day=TruncDate('order__order_date'))
+        if date_from:
+            rollup = rollup.filter(day__gte=date_from)
+            merchant_rollup = merchant_rollup.filter(day__gte=date_from)
+            items = items.filter(day__gte=date_from)
+        if date_to:
+            rollup = rollup.filter(day__lte=date_to)
+            merchant_rollup = merchant_rollup.filter(day__lte=date_to)
+            items = items.filter(day__lte=date_to)
+
+        sales = items.values('day', 'product_id', 'product__merchant_id').annotate(
+            units=Sum('quantity'),
+            revenue=Sum(F('quantity') * F('unit_price')),
+        ).order_by()
+        merchant_sales = items.values('day', 'product__merchant_id').annotate(
+            orders=Count('order_id', distinct=True),
+            units=Sum('quantity'),
+            revenue=Sum(F('quantity') * F('unit_price')),
+        ).order_by()
+
+        created = 0
+        with transaction.atomic():
+            rollup.delete()
+            batch = []
+            for row in sales.iterator(chunk_size=options['batch_size']):
+                batch.append(ProductDailySales(
+                    merchant_id=row['product__merchant_id'],
+                    product_id=row['product_id'],
+                    day=row['day'],
+                    units=row['units'],
+                    revenue=row['revenue'],
+                ))
+                if len(batch) >= options['batch_size']:
+                    created += len(ProductDailySales.objects.bulk_create(batch))
+                    batch = []
+            created += len(ProductDailySales.objects.bulk_create(batch))
+
+            # Merchants whose rows change, including any left without sales.
+            merchant_ids = set(merchant_rollup.values_list('merchant_id', flat=True).distinct())
+            merchant_rollup.delete()
+            merchant_rows = MerchantDailySales.objects.bulk_create([
+                MerchantDailySales(
+                    merchant_id=row['product__merchant_id'],
+                    day=row['day'],
+                    orders=row['orders'],
+                    units=row['units'],
+                    revenue=row['revenue'],
+                )
+                for row in merchant_sales.iterator(chunk_size=options['batch_size'])
+            ], batch_size=options['batch_size'])
+            merchant_ids.update(row.merchant_id for row in merchant_rows)
+            transaction.on_commit(lambda: invalidate_dashboards(merchant_ids))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {created} product and {len(merchant_rows)} merchant daily sales rows.'
+        ))
@@ -0,0 +1,47 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from store.models import Product
+from store.tasks import generate_product_renditions
+
+
+def regenerate_chunk(product_ids):
+    """Regenerate renditions for a chunk of products, returning the failed ids."""
+    failed = []
+    for product_id in product_ids:
+        try:
+            generate_product_renditions(product_id)
+        except (OSError, ValueError):
+            failed.append(product_id)
+    return len(product_ids), failed
+
+
+class Command(BaseCommand):
+    help = 'Regenerate image renditions for the whole product catalogue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes.')
+        parser.add_argument('--chunk-size', type=int, default=100, help='Products handed to a worker at a time.')
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.exclude(image='').order_by('id').values_list('id', flat=True))
+        chunk_size = options['chunk_size']
+        chunks = [product_ids[offset:offset + chunk_size] for offset in range(0, len(product_ids), chunk_size)]
+
+        if options['workers'] > 1:
+            # Child processes must open their own database connections.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+                results = list(pool.map(regenerate_chunk, chunks))
+        else:
+            results = [regenerate_chunk(chunk) for chunk in chunks]
+
+        processed = sum(count for count, _ in results)
+        failed = [product_id for _, chunk_failed in results for product_id in chunk_failed]
+        if failed:
+            self.stderr.write(f'Could not process products: {failed}')
+        self.stdout.write(self.style.SUCCESS(f'Regenerated renditions for {processed - len(failed)} products.'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from store.seeding import seed_store
+
+
+class Command(BaseCommand):
+    help = 'Seed the database with a deterministic set of users, products and orders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=100)
+        parser.add_argument('--merchants', type=int, default=10)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--max-items', type=int, default=5, help='Maximum number of line items per order.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        created = seed_store(
+            customers=options['customers'],
+            merchants=options['merchants'],
+            categories=options['categories'],
+            products=options['products'],
+            orders=options['orders'],
+            max_items=options['max_items'],
+            seed=options['seed'],
+        )
+        summary = ', '.join(f'{count} {name}' for name, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f'Created {summary}.'))
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE store_product_fts USING fts5(name, description, tokenize='unicode61 remove_diacritics 2')",
+    'INSERT INTO store_product_fts (rowid, name, description) SELECT id, name, description FROM store_product',
+]
+SQLITE_REVERSE = ['DROP TABLE store_product_fts']
+
+POSTGRESQL_FORWARD = [
+    'CREATE TABLE store_product_search ('
+    'product_id bigint PRIMARY KEY REFERENCES store_product (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+    'document tsvector NOT NULL)',
+    'CREATE INDEX store_product_search_document_idx ON store_product_search USING GIN (document)',
+    "INSERT INTO store_product_search (product_id, document) SELECT id, "
+    "setweight(to_tsvector('english', name), 'A') || setweight(to_tsvector('english', description), 'B') "
+    'FROM store_product',
+]
+POSTGRESQL_REVERSE = ['DROP TABLE store_product_search']
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_catalogue_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRESQL_FORWARD}),
+            run_statements({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRESQL_REVERSE}),
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations, models, transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+BACKFILL_CHUNK_SIZE = 2000
+
+
+def update_in_chunks(queryset, **values):
+    """Update the queryset's rows in primary key order, committing each chunk separately."""
+    last_pk = None
+    while True:
+        chunk = queryset.order_by('pk')
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        pks = list(chunk.values_list('pk', flat=True)[:BACKFILL_CHUNK_SIZE])
+        if not pks:
+            return
+        with transaction.atomic(using=queryset.db):
+            queryset.filter(pk__gte=pks[0], pk__lte=pks[-1]).update(**values)
+        last_pk = pks[-1]
+
+
+def backfill(apps, schema_editor):
+    db = schema_editor.connection.alias
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+    Product = apps.get_model('store', 'Product')
+
+    # Lines placed before this migration only have the product's current price.
+    update_in_chunks(
+        OrderItem.objects.using(db).filter(unit_price__isnull=True),
+        unit_price=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('price')[:1]),
+    )
+    units = OrderItem.objects.filter(order_id=OuterRef('pk')).order_by().values('order_id').annotate(
+        units=Sum('quantity'),
+    ).values('units')
+    update_in_chunks(
+        Order.objects.using(db),
+        item_count=Coalesce(Subquery(units), Value(0), output_field=models.PositiveIntegerField()),
+    )
+
+
+class Migration(migrations.Migration):
+    # Each chunk commits on its own, so large tables are not locked for the whole backfill.
+    atomic = False
+
+    dependencies = [
+        ('store', '0013_order_item_count_orderitem_unit_price'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
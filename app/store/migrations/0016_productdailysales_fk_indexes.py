@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('store', '0015_orderitem_unit_price_not_null'),
+    ]
+
+    operations = [
+        # store_sales_merchant_day_idx and the product/day unique constraint lead with these.
+        migrations.AlterField(
+            model_name='productdailysales',
+            name='merchant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='productdailysales',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='store.product'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 17:44
+
+from django.db import migrations, models
+
+
+# Earlier changes to the order models that were never migrated.
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_productdailysales_fk_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='order',
+            name='products',
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=10),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='quantity',
+            field=models.PositiveIntegerField(),
+        ),
+    ]
@@ -1,81 +1,310 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Value, When
 from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
-from PIL import Image
-from .tasks import send_payment_reminder_email
-import os
+from decimal import Decimal
+from .tasks import enqueue, generate_product_renditions, order_placed
+from functools import partial
+from collections import Counter
+from .cache import catalogue_changed, invalidate_dashboards
 
 
 class Category(models.Model):
     name = models.CharField(max_length=255, unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
+class InsufficientStock(Exception):
+    """Raised when products do not have enough stock left for an order."""
+
+    def __init__(self, available):
+        # Product id to the units still in stock, for each product that is short.
+        self.available = available
+        super().__init__(f'Insufficient stock for product(s) {sorted(available)}.')
+
+
+class ProductManager(models.Manager):
+    """Manager for products."""
+
+    def reserve_stock(self, demand):
+        """Take `demand`, a {product id: quantity} mapping, off the products' stock.
+
+        Must run inside a transaction. The rows are locked in product id
+        order, so concurrent orders sharing products cannot deadlock, and all
+        tracked products are decremented by a single conditional UPDATE.
+        Products without a stock quantity are not tracked. Raises
+        InsufficientStock without changing anything when a product is short.
+        """
+        stock = dict(
+            self.select_for_update().filter(pk__in=demand, stock__isnull=False).order_by('pk').values_list('pk', 'stock')
+        )
+        if not stock:
+            return
+        short = {pk: available for pk, available in stock.items() if available < demand[pk]}
+        if short:
+            raise InsufficientStock(short)
+
+        condition = Q()
+        for pk in stock:
+            condition |= Q(pk=pk, stock__gte=demand[pk])
+        updated = self.filter(condition).update(
+            stock=Case(
+                *(When(pk=pk, then=F('stock') - demand[pk]) for pk in stock),
+                default=F('stock'),
+                output_field=models.PositiveIntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+        if updated != len(stock):
+            # Only reachable on databases without row locks.
+            current = dict(self.filter(pk__in=stock).values_list('pk', 'stock'))
+            raise InsufficientStock({pk: current[pk] for pk in stock if current[pk] < demand[pk]})
+        # The update bypasses Product signals. Catalogue lists show the stock
+        # and are validated by the catalogue generation, so every change counts.
+        catalogue_changed()
+
+
 class Product(models.Model):
-    merchant = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='products')
+    merchant = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='products', db_index=False)
+    # Merchant's own stock keeping unit, the key of bulk imports.
+    sku = models.CharField(max_length=64, blank=True, null=True)
     name = models.CharField(max_length=255)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='product_images/')
     thumbnail = models.ImageField(upload_to='product_thumbnails/', blank=True, null=True)
+    # Units available to order; products without a quantity are not tracked.
+    stock = models.PositiveIntegerField(blank=True, null=True)
+    # Rendition key (e.g. "400.webp") to storage name, see store.images.
+    renditions = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProductManager()
+
+    class Meta:
+        indexes = [
+            # One index per ProductListView ordering, with the id tie-breaker used by keyset pagination.
+            models.Index(fields=['name', 'id'], name='store_product_name_id_idx'),
+            models.Index(fields=['category', 'id'], name='store_product_category_id_idx'),
+            models.Index(fields=['price', 'id'], name='store_product_price_id_idx'),
+            # A merchant's products by category and price; also serves lookups by merchant alone.
+            models.Index(fields=['merchant', 'category', 'price'], name='store_product_merch_cat_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['merchant', 'sku'], name='store_product_merchant_sku_uniq'),
+        ]
 
     def save(self, *args, **kwargs):
         is_new = self._state.adding
         super().save(*args, **kwargs)
         if self.image and is_new:
-            self.generate_thumbnail()
-
-    def get_thumbnail_path(self):
-        base, ext = os.path.splitext(self.image.path)
-        return f'{base}_thumbnail{ext}'
-
-    def create_thumbnail_filename(self):
-        base, ext = os.path.splitext(self.image.name)
-        return f'{base}_thumbnail{ext}'
-
-    def generate_thumbnail(self):
-            try:
-                img = Image.open(self.image.path)
-                if img.width > 200:
-                    output_size = (200, int((200 / img.width) * img.height))
-                    img.thumbnail(output_size, Image.Resampling.LANCZOS)
-                    thumb_path = self.get_thumbnail_path()
-                    img.save(thumb_path)
-
-                    # Update the thumbnail field
-                    self.thumbnail = self.create_thumbnail_filename()
-                    self.save(update_fields=['thumbnail'])
-            except IOError:
-                print("Error in generating thumbnail for", self.image.path)
+            # Renditions are generated by a Celery worker once the product is committed.
+            transaction.on_commit(partial(enqueue, generate_product_renditions, self.pk))
 
     def __str__(self):
         return self.name
 
+class OrderManager(models.Manager):
+    """Manager for orders."""
+
+    def create_with_items(self, customer, items, **extra_fields):
+        """Create, save and return an order together with its line items.
+
+        `items` is an iterable of (product, quantity) pairs where each product
+        already carries its price and merchant, so the whole order is written
+        with one order insert, one stock reservation, one batched item insert
+        and one update of each sales rollup regardless of its size. Raises
+        InsufficientStock, creating nothing, when a product is short.
+        """
+        items = list(items)
+        demand = Counter()
+        for product, quantity in items:
+            demand[product.pk] += quantity
+        total_price = sum((product.price * quantity for product, quantity in items), Decimal('0.00'))
+
+        with transaction.atomic(using=self.db):
+            # Writing the order first also takes SQLite's database write lock
+            # before stock is read, which it could fail to upgrade to when
+            # several checkouts read first.
+            order = self.create(
+                customer=customer, total_price=total_price, item_count=sum(demand.values()), **extra_fields
+            )
+            Product.objects.db_manager(self.db).reserve_stock(demand)
+            OrderItem.objects.using(self.db).bulk_create([
+                OrderItem(order=order, product=product, quantity=quantity, unit_price=product.price)
+                for product, quantity in items
+            ])
+            day = timezone.localdate(order.order_date)
+            ProductDailySales.objects.db_manager(self.db).add_sales(day, items)
+            MerchantDailySales.objects.db_manager(self.db).add_sales(day, items)
+            # Mail and other follow-up work runs in Celery once the order is committed.
+            transaction.on_commit(partial(order_placed, order), using=self.db)
+
+        return order
+
+
 class Order(models.Model):
-    customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    customer = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, db_index=False)
     delivery_address = models.CharField(max_length=255)
     order_date = models.DateTimeField(auto_now_add=True)
     payment_due = models.DateTimeField()
     total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    # Units over all lines, kept with the order so listings need not count them.
+    item_count = models.PositiveIntegerField(default=0)
+    is_paid = models.BooleanField(default=False)
+    payment_reminder_sent_at = models.DateTimeField(blank=True, null=True)
+
+    objects = OrderManager()
+
+    class Meta:
+        indexes = [
+            # Backs the periodic payment reminder sweep, see store.tasks.send_payment_reminders.
+            models.Index(
+                fields=['payment_due'],
+                name='store_order_reminder_due_idx',
+                condition=models.Q(is_paid=False, payment_reminder_sent_at__isnull=True),
+            ),
+            # Date range filters of the admin and the order export.
+            models.Index(fields=['order_date'], name='store_order_date_idx'),
+            # A customer's orders, newest first; also serves lookups by customer alone.
+            models.Index(fields=['customer', 'order_date'], name='store_order_customer_date_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.id:
             if not self.order_date:
                 self.order_date = timezone.now()
             self.payment_due = self.order_date + timedelta(days=5)
-            if self._state.adding:
-                reminder_time = self.payment_due - timedelta(days=1)
-                send_payment_reminder_email.apply_async((self.id,), eta=reminder_time)
         super().save(*args, **kwargs)
 
 
 class OrderItem(models.Model):
-    order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
+    order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE, db_index=False)
     product = models.ForeignKey('Product', on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
+    # The product's price when the order was placed.
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        indexes = [
+            # Finds an order's lines. Reads of products and quantities only, e.g. the sales
+            # rollup rebuild, are covered; unit_price, read by the order history, is not.
+            models.Index(fields=['order', 'product', 'quantity'], name='store_orderitem_order_prod_idx'),
+        ]
 
     def __str__(self):
         return f"{self.quantity} of {self.product.name}"
+
+
+
+class ProductDailySalesManager(models.Manager):
+    """Manager for the product sales rollup."""
+
+    def add_sales(self, day, items):
+        """Add (product, quantity) pairs sold on `day` to the rollup.
+
+        Missing rows are inserted empty and all counters are then incremented
+        with a single conditional UPDATE, so concurrent orders never lose sales.
+        """
+        sales = {}
+        for product, quantity in items:
+            merchant_id, units, revenue = sales.get(product.id, (product.merchant_id, 0, Decimal('0.00')))
+            sales[product.id] = (merchant_id, units + quantity, revenue + product.price * quantity)
+        if not sales:
+            return
+
+        self.bulk_create([
+            ProductDailySales(merchant_id=merchant_id, product_id=product_id, day=day)
+            for product_id, (merchant_id, _, _) in sales.items()
+        ], ignore_conflicts=True)
+        self.filter(day=day, product_id__in=sales).update(
+            units=F('units') + Case(
+                *[When(product_id=product_id, then=Value(units)) for product_id, (_, units, _) in sales.items()],
+                output_field=models.PositiveIntegerField(),
+            ),
+            revenue=F('revenue') + Case(
+                *[When(product_id=product_id, then=Value(revenue)) for product_id, (_, _, revenue) in sales.items()],
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+
+
+class ProductDailySales(models.Model):
+    """Units and revenue sold per product and day, denormalized for statistics."""
+    merchant = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='daily_sales', db_index=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales', db_index=False)
+    day = models.DateField()
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    objects = ProductDailySalesManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='store_productdailysales_product_day_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['merchant', 'day'], name='store_sales_merchant_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.units} of {self.product_id} on {self.day}"
+
+
+class MerchantDailySalesManager(models.Manager):
+    """Manager for the merchant sales rollup."""
+
+    def add_sales(self, day, items):
+        """Add one order's (product, quantity) pairs sold on `day` to the rollup.
+
+        Each merchant with products in the order gets one more order, and the
+        counters are updated like ProductDailySalesManager.add_sales does.
+        Cached dashboards of those merchants are dropped once the order is
+        committed.
+        """
+        sales = {}
+        for product, quantity in items:
+            units, revenue = sales.get(product.merchant_id, (0, Decimal('0.00')))
+            sales[product.merchant_id] = (units + quantity, revenue + product.price * quantity)
+        if not sales:
+            return
+
+        self.bulk_create([
+            MerchantDailySales(merchant_id=merchant_id, day=day) for merchant_id in sales
+        ], ignore_conflicts=True)
+        self.filter(day=day, merchant_id__in=sales).update(
+            orders=F('orders') + 1,
+            units=F('units') + Case(
+                *[When(merchant_id=merchant_id, then=Value(units)) for merchant_id, (units, _) in sales.items()],
+                output_field=models.PositiveIntegerField(),
+            ),
+            revenue=F('revenue') + Case(
+                *[When(merchant_id=merchant_id, then=Value(revenue)) for merchant_id, (_, revenue) in sales.items()],
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+        transaction.on_commit(partial(invalidate_dashboards, list(sales)), using=self.db)
+
+
+class MerchantDailySales(models.Model):
+    """Orders, units and revenue per merchant and day, denormalized for the dashboard."""
+    merchant = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='merchant_daily_sales', db_index=False)
+    day = models.DateField()
+    # Orders with at least one of the merchant's products.
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = MerchantDailySalesManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['merchant', 'day'], name='store_merchantdailysales_merchant_day_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.orders} orders of {self.merchant_id} on {self.day}"
@@ -0,0 +1,335 @@
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """DjangoJSONEncoder keeping the microseconds it drops from datetimes.
+
+    A position rounded to milliseconds would skip or repeat rows.
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """Keyset (seek) pagination over a composite, unique ordering.
+
+    Rows are ordered by the requested `ordering` field plus the primary key as
+    tie-breaker, and each page continues from the last row of the previous one
+    with a `WHERE (field, id) > (value, id)` condition instead of an OFFSET, so
+    every page costs the same no matter how deep it is. Cursors are opaque
+    base64 encoded positions. No total count is computed.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    ordering_param = api_settings.ORDERING_PARAM
+    invalid_cursor_message = 'Invalid cursor.'
+
+    # Used when the request does not ask for one of the view's ordering_fields.
+    ordering = ('id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.get_page(list(self.get_page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.get_page([row async for row in self.get_page_queryset(queryset, request, view)])
+
+    def get_page_queryset(self, queryset, request, view):
+        """Return the query for the requested page plus one row telling whether there are more."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.position, self.reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [self.invert(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            self.position = self.parse_position(queryset.model._meta, self.position)
+            queryset = queryset.filter(self.keyset_filter(ordering, self.position))
+        return queryset[:self.page_size + 1]
+
+    def get_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        self.next_position = self.previous_position = None
+        if rows and (has_more if not self.reverse else self.position is not None):
+            self.next_position = self.get_position(rows[-1])
+        if rows and (has_more if self.reverse else self.position is not None):
+            self.previous_position = self.get_position(rows[0])
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_ordering(self, request, queryset, view):
+        """Return the ordering as model field attnames, ending with the primary key."""
+        ordering = list(self.ordering)
+        requested = request.query_params.get(self.ordering_param, '').strip()
+        if requested.lstrip('-') in getattr(view, 'ordering_fields', ()):
+            ordering = [requested, '-pk' if requested.startswith('-') else 'pk']
+
+        opts = queryset.model._meta
+        return [
+            ('-' if field.startswith('-') else '') + self.get_attname(opts, field.lstrip('-'))
+            for field in ordering
+        ]
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.next_position, False))
+
+    def get_previous_link(self):
+        if self.previous_position is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.encode_cursor(self.previous_position, True))
+
+    def get_position(self, row):
+        fields = [field.lstrip('-') for field in self.ordering]
+        if isinstance(row, dict):
+            return [row[field] for field in fields]
+        return [getattr(row, field) for field in fields]
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps({'p': position, 'r': int(reverse)}, cls=CursorEncoder)
+        return b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position, reverse = payload['p'], bool(payload['r'])
+        except (TypeError, ValueError, KeyError, UnicodeError, BinasciiError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def parse_position(self, opts, position):
+        """Convert the cursor's values with their ordering fields, rejecting tampered ones."""
+        try:
+            position = [
+                opts.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        # Ordering fields are not nullable, so no row comes after a null.
+        if any(value is None for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    @staticmethod
+    def get_attname(opts, name):
+        if name == 'pk':
+            return opts.pk.attname
+        return opts.get_field(name).attname
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def keyset_filter(ordering, position):
+        """Build the lexicographic "row comes after position" condition."""
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {ordered.lstrip('-'): value for ordered, value in zip(ordering[:index], position[:index])}
+            condition |= Q(**equal, **{f'{name}__{lookup}': position[index]})
+        return condition
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """PageNumberPagination that async views can also use, see apaginate_queryset()."""
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async counterpart of paginate_queryset() using the async ORM."""
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Paginator.count is a cached property, so counting up front keeps page() from querying.
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page.object_list = [row async for row in self.page.object_list]
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return list(self.page)
+
+
+class ProductPagination(AsyncPageNumberPagination):
+    """Catalogue pagination with optional keyset and count-free modes.
+
+    By default pages are numbered and carry a total `count`, as for every other
+    endpoint. `?pagination=cursor` (or following a `cursor` link) switches to
+    KeysetPagination, and `?count=false` keeps page numbers but skips the
+    `COUNT(*)` over the filtered catalogue.
+    """
+    pagination_query_param = 'pagination'
+    count_query_param = 'count'
+    keyset_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.select_mode(request)
+        if self.keyset is not None:
+            return self.keyset.paginate_queryset(queryset, request, view)
+        if self.counted:
+            return super().paginate_queryset(queryset, request, view)
+        return self.get_uncounted_page(list(self.get_uncounted_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.select_mode(request)
+        if self.keyset is not None:
+            return await self.keyset.apaginate_queryset(queryset, request, view)
+        if self.counted:
+            return await super().apaginate_queryset(queryset, request, view)
+        return self.get_uncounted_page([row async for row in self.get_uncounted_queryset(queryset, request)])
+
+    def select_mode(self, request):
+        self.keyset = None
+        if (request.query_params.get(self.pagination_query_param) == 'cursor'
+                or self.keyset_pagination_class.cursor_query_param in request.query_params):
+            self.keyset = self.keyset_pagination_class()
+        self.counted = request.query_params.get(self.count_query_param, '').lower() not in ('0', 'false')
+
+    def get_uncounted_queryset(self, queryset, request):
+        self.request = request
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            self.page_number = 0
+        if self.page_number < 1:
+            raise NotFound(self.invalid_page_message.format(page_number=self.page_number, message='Invalid page.'))
+
+        offset = (self.page_number - 1) * self.page_size
+        return queryset[offset:offset + self.page_size + 1]
+
+    def get_uncounted_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        return rows[:self.page_size]
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        if self.counted:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if self.counted:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.counted:
+            return super().get_previous_link()
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+
+class OrderHistoryPagination(KeysetPagination):
+    """Newest orders first, paged on (order_date, id)."""
+    ordering = ('-order_date', '-id')
+
+
+def estimated_row_count(model, using='default'):
+    """Return the table's row count from database statistics, or None if there are none.
+
+    Uses pg_class.reltuples on PostgreSQL and the sqlite_stat1 table written by
+    ANALYZE on SQLite; both are as current as the last (auto)analyze.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [connection.ops.quote_name(table)])
+            row = cursor.fetchone()
+            # reltuples is -1 for a table that has never been analyzed.
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+            except DatabaseError:
+                # ANALYZE has never run, so there is no statistics table.
+                return None
+            # Each row describes one index; the first number is its row count.
+            counts = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+            return max(counts) if counts else None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that takes the count of a whole large table from its statistics.
+
+    COUNT(*) reads every row, which dominates the admin changelist of a big
+    table. Unfiltered querysets of tables estimated to hold at least
+    `estimate_threshold` rows use estimated_row_count() instead; filtered
+    ones and smaller tables are counted exactly.
+    """
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if isinstance(queryset, QuerySet) and not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                return estimate
+        return super().count
@@ -0,0 +1,204 @@
+"""
+Full-text product search.
+
+The search index lives in a side table next to store_product, created by
+migration 0008: an FTS5 virtual table on SQLite and a tsvector column with a
+GIN index on PostgreSQL. It is kept in sync by the signals in store.signals
+and can be rebuilt with the rebuild_search_index management command.
+"""
+import re
+
+from django.db import connection, connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchBackend:
+    """Ranked full-text search over product names and descriptions."""
+
+    def index(self, products):
+        """Add or replace (id, name, description) rows in the index."""
+        raise NotImplementedError
+
+    def remove(self, product_ids):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def count(self, query):
+        raise NotImplementedError
+
+    def search(self, query, limit=None, offset=0):
+        """Return matching product ids, best match first."""
+        raise NotImplementedError
+
+    def filter(self, queryset, query):
+        """Restrict a product queryset to matches, without ranking."""
+        raise NotImplementedError
+
+    def read_connection(self):
+        """Return the connection product reads are routed to, e.g. a read replica."""
+        from .models import Product
+        return connections[router.db_for_read(Product)]
+
+
+class SQLiteSearchBackend(SearchBackend):
+    table = 'store_product_fts'
+
+    @staticmethod
+    def match_expression(query):
+        # Quote every word so user input can never be parsed as FTS5 syntax,
+        # and let the last one match as a prefix for search-as-you-type.
+        terms = ['"{}"'.format(word.replace('"', '""')) for word in WORD_RE.findall(query)]
+        if terms:
+            terms[-1] += '*'
+        return ' '.join(terms)
+
+    def index(self, products):
+        products = list(products)
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(product_id,) for product_id, _, _ in products])
+            cursor.executemany(f'INSERT INTO {self.table} (rowid, name, description) VALUES (%s, %s, %s)', products)
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(product_id,) for product_id in product_ids])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+
+    def count(self, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return 0
+        with self.read_connection().cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {self.table} WHERE {self.table} MATCH %s', [expression])
+            return cursor.fetchone()[0]
+
+    def search(self, query, limit=None, offset=0):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        with self.read_connection().cursor() as cursor:
+            # Name matches weigh more than description matches.
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s '
+                f'ORDER BY bm25({self.table}, 2.0, 1.0), rowid LIMIT %s OFFSET %s',
+                [expression, -1 if limit is None else limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def filter(self, queryset, query):
+        expression = self.match_expression(query)
+        if not expression:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', [expression]))
+
+
+class PostgreSQLSearchBackend(SearchBackend):
+    table = 'store_product_search'
+    document = "setweight(to_tsvector('english', %s), 'A') || setweight(to_tsvector('english', %s), 'B')"
+
+    def index(self, products):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (product_id, document) VALUES (%s, {self.document}) '
+                'ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document',
+                list(products),
+            )
+
+    def remove(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE product_id = ANY(%s)', [list(product_ids)])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {self.table}')
+
+    def count(self, query):
+        with self.read_connection().cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {self.table} WHERE document @@ websearch_to_tsquery('english', %s)",
+                [query],
+            )
+            return cursor.fetchone()[0]
+
+    def search(self, query, limit=None, offset=0):
+        with self.read_connection().cursor() as cursor:
+            cursor.execute(
+                f"SELECT product_id FROM {self.table}, websearch_to_tsquery('english', %s) query "
+                'WHERE document @@ query ORDER BY ts_rank(document, query) DESC, product_id LIMIT %s OFFSET %s',
+                [query, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def filter(self, queryset, query):
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT product_id FROM {self.table} WHERE document @@ websearch_to_tsquery('english', %s)",
+            [query],
+        ))
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """Unindexed fallback for databases without full-text search support."""
+
+    def index(self, products):
+        pass
+
+    def remove(self, product_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def get_queryset(self, query):
+        from .models import Product
+        return self.filter(Product.objects.order_by('pk'), query)
+
+    def count(self, query):
+        return self.get_queryset(query).count()
+
+    def search(self, query, limit=None, offset=0):
+        ids = self.get_queryset(query).values_list('pk', flat=True)
+        return list(ids[offset:offset + limit] if limit is not None else ids[offset:])
+
+    def filter(self, queryset, query):
+        for word in WORD_RE.findall(query):
+            queryset = queryset.filter(Q(name__icontains=word) | Q(description__icontains=word))
+        return queryset
+
+
+def get_search_backend():
+    if connection.vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    if connection.vendor == 'postgresql':
+        return PostgreSQLSearchBackend()
+    return DatabaseSearchBackend()
+
+
+class SearchResults:
+    """Lazily sliced, ranked search results, usable with Django's Paginator."""
+
+    def __init__(self, queryset, query, backend=None):
+        self.queryset = queryset
+        self.query = query
+        self.backend = backend or get_search_backend()
+
+    def count(self):
+        return self.backend.count(self.query)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError('Search results only support slicing.')
+        start = index.start or 0
+        limit = None if index.stop is None else max(index.stop - start, 0)
+        ids = self.backend.search(self.query, limit=limit, offset=start)
+        products = self.queryset.in_bulk(ids)
+        return [products[product_id] for product_id in ids if product_id in products]
@@ -0,0 +1,110 @@
+"""
+Deterministic fixture generator for benchmarks and local development.
+
+The same arguments always produce the same users, catalogue and orders, so
+benchmark results from different commits can be compared.
+"""
+import random
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import transaction
+
+from user.models import User
+from .models import Category, Order, OrderItem, Product
+
+# Orders are spread over the year starting here.
+ORDER_DATES_START = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+SEED_PASSWORD = 'benchmark'
+
+WORDS = (
+    'red', 'blue', 'green', 'classic', 'modern', 'compact', 'deluxe', 'wireless', 'organic', 'vintage',
+    'guitar', 'lamp', 'chair', 'notebook', 'kettle', 'backpack', 'camera', 'jacket', 'speaker', 'watch',
+)
+
+
+def customer_email(index):
+    return f'customer{index}@example.com'
+
+
+def merchant_email(index):
+    return f'merchant{index}@example.com'
+
+
+@transaction.atomic
+def seed_store(customers=100, merchants=10, categories=20, products=1000, orders=1000, max_items=5,
+               seed=0, days=365, batch_size=1000):
+    """Create a deterministic data set and return the number of rows created per model."""
+    rng = random.Random(seed)
+    password = make_password(SEED_PASSWORD, salt='benchmark')
+
+    merchant_ids = [user.id for user in User.objects.bulk_create([
+        User(email=merchant_email(i), name=f'Merchant {i}', surname='Seed', password=password, is_merchant=True)
+        for i in range(merchants)
+    ], batch_size=batch_size)]
+    customer_ids = [user.id for user in User.objects.bulk_create([
+        User(email=customer_email(i), name=f'Customer {i}', surname='Seed', password=password)
+        for i in range(customers)
+    ], batch_size=batch_size)]
+    category_ids = [category.id for category in Category.objects.bulk_create([
+        Category(name=f'Seed category {i}') for i in range(categories)
+    ])]
+
+    catalogue = []
+    for i in range(products):
+        name = ' '.join(rng.choice(WORDS) for _ in range(3)).capitalize()
+        catalogue.append(Product(
+            merchant_id=rng.choice(merchant_ids),
+            category_id=rng.choice(category_ids),
+            name=f'{name} {i}',
+            description=' '.join(rng.choice(WORDS) for _ in range(20)),
+            price=Decimal(rng.randrange(100, 100000)) / 100,
+        ))
+    Product.objects.bulk_create(catalogue, batch_size=batch_size)
+    prices = {product.id: product.price for product in catalogue}
+    product_ids = list(prices)
+
+    created_orders = []
+    order_dates = []
+    lines = []
+    for _ in range(orders):
+        order_date = ORDER_DATES_START + timedelta(seconds=rng.randrange(days * 24 * 60 * 60))
+        items = [(rng.choice(product_ids), rng.randint(1, 5)) for _ in range(rng.randint(1, max_items))]
+        created_orders.append(Order(
+            customer_id=rng.choice(customer_ids),
+            delivery_address=f'Seed street {rng.randint(1, 500)}',
+            order_date=order_date,
+            payment_due=order_date + timedelta(days=5),
+            total_price=sum(prices[product_id] * quantity for product_id, quantity in items),
+            item_count=sum(quantity for _, quantity in items),
+            is_paid=rng.random() < 0.8,
+        ))
+        order_dates.append(order_date)
+        lines.append(items)
+    Order.objects.bulk_create(created_orders, batch_size=batch_size)
+    # order_date is auto_now_add, so the generated dates are written afterwards.
+    for order, order_date in zip(created_orders, order_dates):
+        order.order_date = order_date
+    Order.objects.bulk_update(created_orders, ['order_date'], batch_size=batch_size)
+
+    OrderItem.objects.bulk_create([
+        OrderItem(order=order, product_id=product_id, quantity=quantity, unit_price=prices[product_id])
+        for order, items in zip(created_orders, lines)
+        for product_id, quantity in items
+    ], batch_size=batch_size)
+
+    # Bulk inserts bypass the incremental rollup and search index signals.
+    call_command('rebuild_sales_rollup', stdout=StringIO())
+    call_command('rebuild_search_index', stdout=StringIO())
+
+    return {
+        'merchants': len(merchant_ids),
+        'customers': len(customer_ids),
+        'categories': len(category_ids),
+        'products': len(catalogue),
+        'orders': len(created_orders),
+        'order_items': sum(len(items) for items in lines),
+    }
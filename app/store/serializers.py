@@ -1,54 +1,224 @@
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db.models import prefetch_related_objects
+from django.utils.encoding import filepath_to_uri
+from django.utils.functional import cached_property
 from rest_framework import serializers
-from .models import Product, Category, Order, OrderItem
+from app.metrics import TimedSerializerMixin
+from .models import Category, InsufficientStock, Order, OrderItem, Product
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name']
 
 
-class ProductSerializer(serializers.ModelSerializer):
-    merchant = serializers.ReadOnlyField(source='merchant.id')
+class ProductSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    merchant = serializers.ReadOnlyField(source='merchant_id')
 
     class Meta:
         model = Product
-        fields = ['id', 'name', 'description', 'price', 'category', 'image', 'thumbnail', 'merchant']
+        fields = ['id', 'sku', 'name', 'description', 'price', 'stock', 'category', 'image', 'thumbnail', 'merchant']
 
+    def validate_sku(self, value):
+        if value:
+            products = self.context['request'].user.products.filter(sku=value)
+            if self.instance is not None:
+                products = products.exclude(pk=self.instance.pk)
+            if products.exists():
+                raise serializers.ValidationError('You already have a product with this SKU.')
+        return value or None
 
-class OrderItemSerializer(serializers.ModelSerializer):
-    product_price = serializers.DecimalField(source='product.price', max_digits=10, decimal_places=2, read_only=True)
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+class ProductRowSerializer(serializers.BaseSerializer):
+    """Read-only ProductSerializer for `.values(*ProductRowSerializer.value_fields)` rows.
+
+    Renders the same output as ProductSerializer without building model
+    instances or going through per-field serializer machinery. Media URLs of
+    file system storage are built from a prefix computed once per serializer.
+    """
+    value_fields = ('id', 'sku', 'name', 'description', 'price', 'stock', 'category_id', 'image', 'thumbnail', 'merchant_id')
+    price_places = Product._meta.get_field('price').decimal_places
+
+    class Meta:
+        # Timed per page rather than per row.
+        list_serializer_class = TimedListSerializer
+
+    def to_representation(self, row):
+        return {
+            'id': row['id'],
+            'sku': row['sku'],
+            'name': row['name'],
+            'description': row['description'],
+            'price': f'{row["price"]:.{self.price_places}f}',
+            'stock': row['stock'],
+            'category': row['category_id'],
+            'image': self.media_url(row['image']),
+            'thumbnail': self.media_url(row['thumbnail']),
+            'merchant': row['merchant_id'],
+        }
+
+    def media_url(self, name):
+        if not name:
+            return None
+        if self.media_url_prefix is None:
+            return self.absolute_url(default_storage.url(name))
+        return self.media_url_prefix + filepath_to_uri(name)
+
+    @cached_property
+    def media_url_prefix(self):
+        if not isinstance(default_storage, FileSystemStorage):
+            return None
+        return self.absolute_url(default_storage.base_url)
+
+    def absolute_url(self, url):
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+
+class OrderItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # Products are resolved for the whole order at once in OrderSerializer.validate_items.
+    product = serializers.IntegerField(source='product_id')
+    # The price the product was ordered at.
+    product_price = serializers.DecimalField(source='unit_price', max_digits=10, decimal_places=2, read_only=True)
 
     class Meta:
         model = OrderItem
         fields = ['product', 'quantity', 'product_price']
 
-class ProductStatisticSerializer(serializers.Serializer):
+def insufficient_stock_errors(error):
+    return [
+        f'Only {available} unit(s) of product {product_id} left in stock.'
+        for product_id, available in sorted(error.available.items())
+    ]
+
+
+class ProductStatisticSerializer(TimedSerializerMixin, serializers.Serializer):
     product_name = serializers.CharField()
     total_ordered = serializers.IntegerField()
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class DashboardProductSerializer(TimedSerializerMixin, serializers.Serializer):
+    product = serializers.IntegerField()
+    name = serializers.CharField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class DashboardDaySerializer(TimedSerializerMixin, serializers.Serializer):
+    day = serializers.DateField()
+    orders = serializers.IntegerField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+
+
+class DashboardWindowSerializer(TimedSerializerMixin, serializers.Serializer):
+    days = serializers.IntegerField()
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    orders = serializers.IntegerField()
+    units = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    top_products = DashboardProductSerializer(many=True)
+    daily = DashboardDaySerializer(many=True)
+
+
+class MerchantDashboardSerializer(TimedSerializerMixin, serializers.Serializer):
+    date = serializers.DateField()
+    windows = DashboardWindowSerializer(many=True)
+
+
+class CartItemSerializer(TimedSerializerMixin, serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+    def validate_product(self, value):
+        if not Product.objects.filter(pk=value).exists():
+            raise serializers.ValidationError(f'Invalid product id: {value}.')
+        return value
+
+
+class CartQuantitySerializer(TimedSerializerMixin, serializers.Serializer):
+    quantity = serializers.IntegerField(min_value=0, help_text='Zero removes the product.')
+
+
+class CartLineSerializer(TimedSerializerMixin, serializers.Serializer):
+    product = serializers.IntegerField()
+    name = serializers.CharField()
+    price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    quantity = serializers.IntegerField()
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class CartSerializer(TimedSerializerMixin, serializers.Serializer):
+    items = CartLineSerializer(many=True)
+    item_count = serializers.IntegerField()
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+class CheckoutSerializer(TimedSerializerMixin, serializers.Serializer):
+    delivery_address = serializers.CharField(max_length=255)
+
+
+class OrderHistoryItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    product = serializers.IntegerField(source='product_id')
+    product_name = serializers.CharField(source='product.name')
+
+    class Meta:
+        model = OrderItem
+        fields = ['product', 'product_name', 'quantity', 'unit_price']
+        read_only_fields = fields
+
+
+class OrderHistorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """A customer's past order, read from the order row and its line snapshots."""
+    items = OrderHistoryItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ['id', 'order_date', 'delivery_address', 'payment_due', 'is_paid', 'total_price', 'item_count', 'items']
+        read_only_fields = fields
+
+
+class OrderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True)
 
     class Meta:
         model = Order
         fields = ['delivery_address', 'items']
 
+    def validate_items(self, items):
+        product_ids = {item['product_id'] for item in items}
+        products = Product.objects.only('id', 'price', 'merchant').in_bulk(product_ids)
+        missing = sorted(product_ids - products.keys())
+        if missing:
+            raise serializers.ValidationError(f'Invalid product id(s): {missing}.')
+
+        for item in items:
+            item['product'] = products[item.pop('product_id')]
+        return items
+
     def create(self, validated_data):
         items_data = validated_data.pop('items')
 
         customer = self.context['request'].user
-        order = Order.objects.create(customer=customer, **validated_data)
-        total_price = 0
-        for item_data in items_data:
-            item = OrderItem.objects.create(order=order, **item_data)
-            total_price += item.product.price * item.quantity
-        order.total_price = total_price
-        order.save()
+        try:
+            order = Order.objects.create_with_items(
+                customer,
+                [(item['product'], item['quantity']) for item in items_data],
+                **validated_data
+            )
+        except InsufficientStock as error:
+            raise serializers.ValidationError({'items': insufficient_stock_errors(error)})
+        prefetch_related_objects([order], 'items')
         return order
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         representation['total_price'] = instance.total_price
-        representation['customer'] = instance.customer.id
+        representation['item_count'] = instance.item_count
+        representation['customer'] = instance.customer_id
         return representation
\ No newline at end of file
@@ -1,15 +1,145 @@
+import logging
+from datetime import timedelta
+from smtplib import SMTPException
+
 from celery import shared_task
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Mail tasks are retried with exponential backoff when the mail server is unreachable.
+MAIL_RETRY_OPTIONS = {
+    'autoretry_for': (SMTPException, OSError),
+    'retry_backoff': True,
+    'retry_backoff_max': 600,
+    'retry_jitter': True,
+    'max_retries': 5,
+}
+
+# Storage name of this rendition is also kept in Product.thumbnail.
+THUMBNAIL_RENDITION = (200, 'JPEG')
+
+# Unpaid orders whose payment is due within this window get a reminder.
+PAYMENT_REMINDER_WINDOW = timedelta(days=1)
+PAYMENT_REMINDER_CHUNK_SIZE = 500
+
+
+def send_messages(messages):
+    """Send all messages over a single mail connection."""
+    if not messages:
+        return 0
+    with get_connection() as connection:
+        return connection.send_messages(messages)
+
+
+def enqueue(task, *args):
+    """Queue a task, logging instead of raising when the broker is unavailable.
+
+    Meant for on_commit callbacks: the data they follow up on is already
+    committed, so a broker outage must not turn the request into an error.
+    """
+    try:
+        task.delay(*args)
+    except Exception:
+        logger.exception('Could not queue %s%r.', getattr(task, 'name', task), args)
+
+
+def order_placed(order):
+    """Hand a committed order over to the post-checkout pipeline."""
+    enqueue(send_order_confirmation_emails, [order.id])
+
+
+@shared_task(**MAIL_RETRY_OPTIONS)
+def send_order_confirmation_emails(order_ids):
+    from .models import Order
+    orders = Order.objects.filter(id__in=order_ids).values_list('id', 'customer__email')
+
+    return send_messages([
+        EmailMessage(
+            'Order Confirmation',
+            f'Your order with ID {order_id} has been placed successfully.',
+            'from@example.com',
+            [email],
+        )
+        for order_id, email in orders
+    ])
+
 
 @shared_task
-def send_payment_reminder_email(order_id):
+def send_payment_reminders(chunk_size=PAYMENT_REMINDER_CHUNK_SIZE):
+    """Remind customers of unpaid orders due within PAYMENT_REMINDER_WINDOW.
+
+    Runs periodically from Celery beat. Each chunk of orders is claimed by
+    setting payment_reminder_sent_at before mailing, so overlapping sweeps
+    never remind the same order twice.
+    """
     from .models import Order
-    order = Order.objects.get(id=order_id)
-
-    send_mail(
-        'Payment Reminder',
-        'Your payment is due tomorrow.',
-        'from@example.com',
-        [order.customer.email],
-        fail_silently=False,
+    now = timezone.now()
+    due_orders = Order.objects.filter(
+        is_paid=False,
+        payment_reminder_sent_at__isnull=True,
+        payment_due__gt=now,
+        payment_due__lte=now + PAYMENT_REMINDER_WINDOW,
     )
+
+    sent = 0
+    while True:
+        with transaction.atomic():
+            reminders = list(
+                due_orders.select_for_update(skip_locked=True, of=('self',))
+                .order_by('payment_due')
+                .values_list('id', 'customer__email')[:chunk_size]
+            )
+            order_ids = [order_id for order_id, _ in reminders]
+            Order.objects.filter(id__in=order_ids).update(payment_reminder_sent_at=now)
+
+        if not reminders:
+            return sent
+
+        try:
+            send_messages([
+                EmailMessage(
+                    'Payment Reminder',
+                    'Your payment is due tomorrow.',
+                    'from@example.com',
+                    [email],
+                )
+                for _, email in reminders
+            ])
+        except Exception:
+            # Release the claim so the next sweep retries this chunk.
+            Order.objects.filter(id__in=order_ids).update(payment_reminder_sent_at=None)
+            raise
+        sent += len(reminders)
+
+
+@shared_task
+def generate_product_renditions(product_id):
+    """Generate all configured renditions of a product image.
+
+    Safe to run repeatedly; every run overwrites the previous renditions.
+    """
+    from .cache import bump_catalogue_generation
+    from .images import generate_renditions, rendition_key
+    from .models import Product
+    product = Product.objects.filter(id=product_id).only('id', 'image').first()
+    if product is None or not product.image:
+        return None
+
+    renditions = generate_renditions(product.image)
+    Product.objects.filter(id=product_id).update(
+        renditions=renditions,
+        thumbnail=renditions.get(rendition_key(*THUMBNAIL_RENDITION)),
+        updated_at=timezone.now(),
+    )
+    bump_catalogue_generation()
+    return renditions
+
+
+@shared_task
+def generate_product_renditions_batch(product_ids):
+    """Generate renditions for many products, e.g. after a bulk import."""
+    for product_id in product_ids:
+        generate_product_renditions(product_id)
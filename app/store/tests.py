@@ -1,3 +1,1991 @@
-from django.test import TestCase
+import asyncio
+from collections import Counter
+import csv
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+import json
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import threading
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.contrib.admin import site
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.db.models import QuerySet, Sum
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import IsAuthenticated
+from PIL import Image
+from redis.exceptions import WatchError
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from rest_framework.throttling import AnonRateThrottle
+
+from app.db import database_config, replica_config, replica_configured
+from app.metrics import registry
+from app.routers import PIN_COOKIE, ReplicaRouter
+from user.models import User
+from .cache import get_cache, response_cache_stats
+from .dashboard import build_dashboard
+from .models import Category, InsufficientStock, MerchantDailySales, Order, OrderItem, Product, ProductDailySales
+from .pagination import KeysetPagination
+from .carts import CartFull, RedisCart, get_cart
+from .benchmarks import SCENARIOS, run_benchmarks, run_connection_benchmark, run_serializer_benchmark
+from .exporting import export_queryset
+from .importing import import_products
+from .search import get_search_backend
+from .seeding import seed_store
+from .serializers import OrderSerializer, ProductRowSerializer, ProductSerializer
+from .views import ProductListView
+from .tasks import generate_product_renditions, send_order_confirmation_emails, send_payment_reminders
+
+
+def create_user(email='user@example.com', **extra_fields):
+    return User.objects.create_user(email, 'testpass123', **extra_fields)
+
+
+def create_image(name='image.jpg', size=(1600, 800), image_format='JPEG'):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, image_format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type=f'image/{image_format.lower()}')
+
+
+def create_product(merchant, category, name='Product', price='10.00', **extra_fields):
+    return Product.objects.create(
+        merchant=merchant,
+        category=category,
+        name=name,
+        description=f'{name} description',
+        price=Decimal(price),
+        **extra_fields
+    )
+
+
+class CreateOrderTests(TestCase):
+    """Tests for the order creation endpoint."""
+
+    def setUp(self):
+        self.merchant = create_user('merchant@example.com', is_merchant=True)
+        self.customer = create_user('customer@example.com')
+        self.category = Category.objects.create(name='Books')
+        self.products = [
+            create_product(self.merchant, self.category, name=f'Product {i}', price=f'{i + 1}.50')
+            for i in range(50)
+        ]
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.customer).key}')
+
+    def post_order(self, products):
+        payload = {
+            'delivery_address': 'Main Street 1',
+            'items': [{'product': product.id, 'quantity': 2} for product in products],
+        }
+        return self.client.post(reverse('create-order'), payload, format='json')
+
+    def test_create_order(self):
+        res = self.post_order(self.products[:3])
+
+        self.assertEqual(res.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual(order.customer, self.customer)
+        self.assertEqual(order.total_price, Decimal('15.00'))
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(res.data['total_price'], Decimal('15.00'))
+        self.assertEqual([item['product_price'] for item in res.data['items']], ['1.50', '2.50', '3.50'])
+
+    def test_order_keeps_price_snapshot_and_item_count(self):
+        res = self.post_order(self.products[:2])
+        Product.objects.filter(pk=self.products[0].pk).update(price=Decimal('99.00'))
+
+        with CaptureQueriesContext(connection) as queries:
+            data = OrderSerializer(Order.objects.prefetch_related('items').get()).data
+
+        self.assertEqual(res.data['item_count'], 4)
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('store_product', ' '.join(query['sql'] for query in queries))
+        self.assertEqual([item['product_price'] for item in data['items']], ['1.50', '2.50'])
+        self.assertEqual((data['item_count'], data['total_price']), (4, Decimal('8.00')))
+
+    def test_create_order_invalid_product(self):
+        res = self.client.post(reverse('create-order'), {
+            'delivery_address': 'Main Street 1',
+            'items': [{'product': 0, 'quantity': 1}],
+        }, format='json')
+
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('items', res.data)
+        self.assertFalse(Order.objects.exists())
+
+    def test_query_count_independent_of_item_count(self):
+        # Authenticate once so both requests find the token in the cache.
+        self.client.get(reverse('user:me'))
+        with CaptureQueriesContext(connection) as small:
+            self.post_order(self.products[:1])
+        with CaptureQueriesContext(connection) as large:
+            self.post_order(self.products)
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(OrderItem.objects.filter(order__in=Order.objects.all()).count(), 51)
+
+    @mock.patch('store.tasks.send_order_confirmation_emails')
+    def test_post_checkout_pipeline_runs_after_commit(self, mock_confirmation):
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self.post_order(self.products[:1])
+
+        self.assertEqual(res.status_code, 201)
+        mock_confirmation.delay.assert_not_called()
+        self.assertEqual(len(mail.outbox), 0)
+
+        for callback in callbacks:
+            callback()
+        order = Order.objects.get()
+        mock_confirmation.delay.assert_called_once_with([order.id])
+
+    @mock.patch('store.tasks.send_order_confirmation_emails.delay', side_effect=ConnectionRefusedError)
+    def test_order_succeeds_when_broker_is_down(self, mock_delay):
+        with self.assertLogs('store.tasks', 'ERROR') as logs, self.captureOnCommitCallbacks(execute=True):
+            res = self.post_order(self.products[:1])
+
+        self.assertEqual(res.status_code, 201)
+        mock_delay.assert_called_once_with([Order.objects.get().id])
+        self.assertIn('Could not queue', logs.output[0])
+
+    def test_send_order_confirmation_emails(self):
+        orders = [
+            Order.objects.create_with_items(self.customer, [(self.products[0], 1)], delivery_address='Main Street 1')
+            for _ in range(3)
+        ]
+
+        with mock.patch('store.tasks.get_connection', wraps=mail.get_connection) as mock_connection:
+            sent = send_order_confirmation_emails([order.id for order in orders])
+
+        self.assertEqual(sent, 3)
+        mock_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].to, ['customer@example.com'])
+
+
+class PaymentReminderTests(TestCase):
+    """Tests for the periodic payment reminder sweep."""
+
+    def setUp(self):
+        self.customer = create_user('customer@example.com')
+
+    def create_order(self, due_in, **extra_fields):
+        order = Order.objects.create(customer=self.customer, delivery_address='Main Street 1', **extra_fields)
+        Order.objects.filter(id=order.id).update(payment_due=timezone.now() + due_in)
+        return order
+
+    def test_reminds_unpaid_orders_due_within_window(self):
+        due = [self.create_order(timedelta(hours=hours)) for hours in (1, 12, 23)]
+        self.create_order(timedelta(days=3))
+        self.create_order(timedelta(hours=5), is_paid=True)
+        self.create_order(-timedelta(hours=1))
+
+        with mock.patch('store.tasks.get_connection', wraps=mail.get_connection) as mock_connection:
+            sent = send_payment_reminders(chunk_size=2)
+
+        self.assertEqual(sent, 3)
+        self.assertEqual(mock_connection.call_count, 2)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(
+            set(Order.objects.filter(payment_reminder_sent_at__isnull=False).values_list('id', flat=True)),
+            {order.id for order in due},
+        )
+
+    def test_reminders_are_sent_once(self):
+        self.create_order(timedelta(hours=1))
+
+        self.assertEqual(send_payment_reminders(), 1)
+        self.assertEqual(send_payment_reminders(), 0)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_chunk_is_released_for_retry(self):
+        order = self.create_order(timedelta(hours=1))
+
+        with mock.patch('store.tasks.send_messages', side_effect=OSError):
+            with self.assertRaises(OSError):
+                send_payment_reminders()
+
+        order.refresh_from_db()
+        self.assertIsNone(order.payment_reminder_sent_at)
+
+
+class ProductListPaginationTests(TestCase):
+    """Tests for the catalogue pagination modes."""
+
+    def setUp(self):
+        self.merchant = create_user('merchant@example.com', is_merchant=True)
+        self.category = Category.objects.create(name='Books')
+        # Repeated prices make the id tie-breaker matter.
+        self.products = [
+            create_product(self.merchant, self.category, name=f'Product {i:02}', price=f'{i % 4}.00')
+            for i in range(25)
+        ]
+        self.client = APIClient()
+
+    def collect_pages(self, url, params):
+        results, pages, res = [], 0, self.client.get(url, params)
+        while True:
+            self.assertEqual(res.status_code, 200)
+            self.assertNotIn('count', res.data)
+            results.extend(product['id'] for product in res.data['results'])
+            pages += 1
+            if not res.data['next']:
+                return results, pages, res
+            res = self.client.get(res.data['next'])
+
+    def test_keyset_pagination_follows_ordering_and_tie_breaker(self):
+        results, pages, _ = self.collect_pages(reverse('product-list'), {'pagination': 'cursor', 'ordering': '-price'})
+
+        expected = [p.id for p in sorted(self.products, key=lambda p: (p.price, p.id), reverse=True)]
+        self.assertEqual(results, expected)
+        self.assertEqual(pages, 3)
+
+    def test_keyset_pagination_previous_link(self):
+        first = self.client.get(reverse('product-list'), {'pagination': 'cursor', 'ordering': 'name'})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(back.data['previous'])
+
+    def test_keyset_pagination_invalid_cursor(self):
+        res = self.client.get(reverse('product-list'), {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_keyset_pagination_tampered_cursor(self):
+        pagination = KeysetPagination()
+        for params in (
+            {'ordering': 'price', 'cursor': pagination.encode_cursor(['cheap', 1], False)},
+            {'ordering': 'price', 'cursor': pagination.encode_cursor([None, 1], False)},
+            {'ordering': 'name', 'cursor': pagination.encode_cursor(['Book', {'id': 1}], False)},
+            {'cursor': pagination.encode_cursor([None], True)},
+        ):
+            with self.subTest(params=params):
+                res = self.client.get(reverse('product-list'), params)
+                self.assertEqual(res.status_code, 404)
+                self.assertEqual(res.data['detail'], 'Invalid cursor.')
+
+    def test_keyset_pagination_query_cost_is_independent_of_depth(self):
+        first = self.client.get(reverse('product-list'), {'pagination': 'cursor'})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.client.get(first.data['next']).data['next'])
+
+        self.assertNotIn('OFFSET', queries[-1]['sql'])
+
+    def test_page_number_pagination_without_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            results, pages, last = self.collect_pages(reverse('product-list'), {'count': 'false', 'ordering': 'name'})
+
+        self.assertEqual(results, [p.id for p in self.products])
+        self.assertEqual(pages, 3)
+        self.assertIn('page=2', last.data['previous'])
+        self.assertFalse(any('COUNT(*)' in query['sql'] for query in queries))
+
+    def test_page_number_pagination_is_the_default(self):
+        res = self.client.get(reverse('product-list'))
+
+        self.assertEqual(res.data['count'], 25)
+        self.assertEqual(len(res.data['results']), 10)
+
+
+class ProductSalesRollupTests(TestCase):
+    """Tests for the product daily sales rollup and the statistics endpoint."""
+
+    def setUp(self):
+        self.merchant = create_user('merchant@example.com', is_merchant=True)
+        self.other_merchant = create_user('other@example.com', is_merchant=True)
+        self.customer = create_user('customer@example.com')
+        category = Category.objects.create(name='Books')
+        self.book = create_product(self.merchant, category, name='Book', price='10.00')
+        self.pen = create_product(self.merchant, category, name='Pen', price='2.50')
+        self.other = create_product(self.other_merchant, category, name='Other', price='1.00')
+        self.client = APIClient()
+        self.client.force_authenticate(self.merchant)
+
+    def place_order(self, *items):
+        return Order.objects.create_with_items(self.customer, items, delivery_address='Main Street 1')
+
+    def test_orders_update_rollup(self):
+        self.place_order((self.book, 2), (self.pen, 1), (self.book, 1))
+        self.place_order((self.pen, 4), (self.other, 7))
+
+        day = timezone.localdate()
+        self.assertEqual(
+            {(row.product_id, row.merchant_id, row.units, row.revenue) for row in ProductDailySales.objects.filter(day=day)},
+            {
+                (self.book.id, self.merchant.id, 3, Decimal('30.00')),
+                (self.pen.id, self.merchant.id, 5, Decimal('12.50')),
+                (self.other.id, self.other_merchant.id, 7, Decimal('7.00')),
+            },
+        )
+
+    def test_statistics_sum_units_for_requesting_merchant(self):
+        self.place_order((self.book, 1), (self.pen, 3))
+        self.place_order((self.book, 1), (self.other, 10))
+        today = timezone.localdate().isoformat()
+
+        res = self.client.get(reverse('product-statistics', args=[today, today, 5]))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(list(res.data), [
+            {'product__name': 'Pen', 'total_ordered': 3},
+            {'product__name': 'Book', 'total_ordered': 2},
+        ])
+
+    def test_rebuild_sales_rollup_matches_incremental_rollup(self):
+        self.place_order((self.book, 2), (self.pen, 1))
+        self.place_order((self.book, 1), (self.other, 3))
+        expected = set(ProductDailySales.objects.values_list('product', 'merchant', 'day', 'units', 'revenue'))
+        ProductDailySales.objects.update(units=0, revenue=0)
+
+        call_command('rebuild_sales_rollup', stdout=StringIO())
+
+        self.assertEqual(set(ProductDailySales.objects.values_list('product', 'merchant', 'day', 'units', 'revenue')), expected)
+
+    def test_orders_update_merchant_rollup(self):
+        self.place_order((self.book, 2), (self.pen, 1))
+        self.place_order((self.pen, 4), (self.other, 7))
+
+        self.assertEqual(
+            set(MerchantDailySales.objects.values_list('merchant', 'day', 'orders', 'units', 'revenue')),
+            {
+                (self.merchant.id, timezone.localdate(), 2, 7, Decimal('32.50')),
+                (self.other_merchant.id, timezone.localdate(), 1, 7, Decimal('7.00')),
+            },
+        )
+
+    def test_rebuild_sales_rollup_matches_incremental_merchant_rollup(self):
+        self.place_order((self.book, 2), (self.pen, 1))
+        self.place_order((self.book, 1), (self.other, 3))
+        expected = set(MerchantDailySales.objects.values_list('merchant', 'day', 'orders', 'units', 'revenue'))
+        MerchantDailySales.objects.all().delete()
+
+        call_command('rebuild_sales_rollup', stdout=StringIO())
+
+        self.assertEqual(set(MerchantDailySales.objects.values_list('merchant', 'day', 'orders', 'units', 'revenue')), expected)
+
+
+class MerchantDashboardTests(TestCase):
+    """Tests for the merchant dashboard endpoint."""
+
+    def setUp(self):
+        get_cache().clear()
+        self.merchant = create_user('merchant@example.com', is_merchant=True)
+        self.other_merchant = create_user('other@example.com', is_merchant=True)
+        self.customer = create_user('customer@example.com')
+        category = Category.objects.create(name='Books')
+        self.book = create_product(self.merchant, category, name='Book', price='10.00')
+        self.pen = create_product(self.merchant, category, name='Pen', price='2.50')
+        self.other = create_product(self.other_merchant, category, name='Other', price='1.00')
+        self.client = APIClient()
+        self.client.force_authenticate(self.merchant)
+
+    def place_order(self, *items, days_ago=0):
+        day = timezone.localdate() - timedelta(days=days_ago)
+        with mock.patch('store.models.order_placed'), self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create_with_items(self.customer, items, delivery_address='Main Street 1')
+            if days_ago:
+                # Move the sales to an earlier day of the rollups.
+                ProductDailySales.objects.filter(day=timezone.localdate()).update(day=day)
+                MerchantDailySales.objects.filter(day=timezone.localdate()).update(day=day)
+        return order
+
+    def test_dashboard_windows(self):
+        self.place_order((self.book, 3), (self.other, 5), days_ago=60)
+        self.place_order((self.pen, 10), days_ago=20)
+        self.place_order((self.book, 1), (self.pen, 2))
+
+        dashboard = build_dashboard(self.merchant.id, windows=(7, 30, 90), top_products=1)
+
+        week, month, quarter = dashboard['windows']
+        self.assertEqual((week['days'], week['orders'], week['units'], week['revenue']), (7, 1, 3, Decimal('15.00')))
+        self.assertEqual((month['orders'], month['units'], month['revenue']), (2, 13, Decimal('40.00')))
+        self.assertEqual((quarter['orders'], quarter['units'], quarter['revenue']), (3, 16, Decimal('70.00')))
+        self.assertEqual([product['name'] for product in week['top_products']], ['Book'])
+        self.assertEqual([product['name'] for product in month['top_products']], ['Pen'])
+        self.assertEqual([product['name'] for product in quarter['top_products']], ['Book'])
+        self.assertEqual(len(quarter['daily']), 90)
+        self.assertEqual(quarter['daily'][-1], {'day': timezone.localdate(), 'orders': 1, 'units': 3, 'revenue': Decimal('15.00')})
+        self.assertEqual(quarter['daily'][-21]['units'], 10)
+        self.assertEqual(week['daily'], quarter['daily'][-7:])
+
+    def test_dashboard_is_built_in_two_queries_and_cached(self):
+        self.place_order((self.book, 1))
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(reverse('merchant-dashboard'))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(res.data['windows'][0]['revenue'], '10.00')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('merchant-dashboard'))
+        self.assertEqual(len(queries), 0)
+
+    def test_new_order_invalidates_only_its_merchants_dashboards(self):
+        other_client = APIClient()
+        other_client.force_authenticate(self.other_merchant)
+        self.client.get(reverse('merchant-dashboard'))
+        other_client.get(reverse('merchant-dashboard'))
+
+        self.place_order((self.book, 2))
+
+        self.assertEqual(self.client.get(reverse('merchant-dashboard')).data['windows'][0]['units'], 2)
+        with CaptureQueriesContext(connection) as queries:
+            other_client.get(reverse('merchant-dashboard'))
+        self.assertEqual(len(queries), 0)
+
+    def test_requires_merchant(self):
+        self.client.force_authenticate(self.customer)
+
+        self.assertEqual(self.client.get(reverse('merchant-dashboard')).status_code, 403)
+
+
+class ProductRenditionTests(TestCase):
+    """Tests for the product image rendition pipeline."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.merchant = create_user('merchant@example.com', is_merchant=True)
+        self.category = Category.objects.create(name='Books')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    @mock.patch('store.tasks.generate_product_renditions.delay')
+    def test_renditions_are_queued_after_commit(self, mock_delay):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = create_product(self.merchant, self.category, image=create_image())
+
+        mock_delay.assert_called_once_with(product.id)
+        product.refresh_from_db()
+        self.assertEqual(product.renditions, {})
+
+    @mock.patch('store.tasks.generate_product_renditions.delay', side_effect=ConnectionRefusedError)
+    def test_product_saved_when_broker_is_down(self, mock_delay):
+        with self.assertLogs('store.tasks', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            product = create_product(self.merchant, self.category, image=create_image())
+
+        mock_delay.assert_called_once_with(product.id)
+        self.assertTrue(Product.objects.filter(pk=product.pk).exists())
+
+    def test_generate_product_renditions(self):
+        product = create_product(self.merchant, self.category, image=create_image())
+
+        renditions = generate_product_renditions(product.id)
+
+        self.assertEqual(set(renditions), {'200.jpg', '200.webp', '400.jpg', '400.webp', '800.jpg', '800.webp'})
+        for key, name in renditions.items():
+            with default_storage.open(name) as image_file:
+                image = Image.open(image_file)
+                self.assertEqual(image.size[0], int(key.split('.')[0]))
+                self.assertEqual(image.size[0], image.size[1] * 2)
+        product.refresh_from_db()
+        self.assertEqual(product.renditions, renditions)
+        self.assertEqual(product.thumbnail.name, renditions['200.jpg'])
+
+    def test_generate_product_renditions_is_idempotent(self):
+        product = create_product(self.merchant, self.category, image=create_image(size=(300, 300), image_format='PNG'))
+
+        first = generate_product_renditions(product.id)
+        second = generate_product_renditions(product.id)
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(default_storage.listdir('product_renditions')[1]), 6)
+        with default_storage.open(first['800.webp']) as image_file:
+            self.assertEqual(Image.open(image_file).size, (300, 300))
+
+    def test_regenerate_renditions_command(self):
+        products = [create_product(self.merchant, self.category, image=create_image(f'{i}.jpg')) for i in range(3)]
+        create_product(self.merchant, self.category)
+
+        call_command('regenerate_renditions', workers=1, chunk_size=2, stdout=StringIO())
+
+        for product in products:
+            product.refresh_from_db()
+            self.assertEqual(len(product.renditions), 6)
+
+
+class CatalogueResponseCacheTests(TestCase):
+    """Tests for the catalogue response cache."""
+
+    def setUp(self):
+        get_cache().clear()
+        self.merchant = create_user('merchant@example.com', is_merchant=True)
+        self.category = Category.objects.create(name='Books')
+        self.product = create_product(self.merchant, self.category, name='Book')
+        self.client = APIClient()
+
+    def test_repeated_reads_are_served_from_cache(self):
+        hits = response_cache_stats['hits']
+        self.client.get(reverse('product-list'), {'ordering': 'name', 'page': 1})
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(reverse('product-list'), {'page': 1, 'ordering': 'name'})
+
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(res['X-Cache'], 'HIT')
+        self.assertEqual(res.data['results'][0]['name'], 'Book')
+        self.assertEqual(response_cache_stats['hits'], hits + 1)
+
+    def test_different_filters_are_cached_separately(self):
+        self.client.get(reverse('product-list'))
+
+        res = self.client.get(reverse('product-list'), {'name': 'Other'})
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'], [])
+
+    def test_product_changes_invalidate_cache(self):
+        url = reverse('product-detail', args=[self.product.id])
+        self.client.get(url)
+        self.client.get(reverse('product-list'))
+
+        self.product.name = 'Renamed'
+        self.product.save()
+
+        res = self.client.get(url)
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['name'], 'Renamed')
+        self.assertEqual(self.client.get(reverse('product-list')).data['results'][0]['name'], 'Renamed')
+
+    def test_category_changes_invalidate_cache(self):
+        self.client.get(reverse('category-list'))
+
+        Category.objects.create(name='Games')
+
+        res = self.client.get(reverse('category-list'))
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['count'], 2)
+
+    def test_errors_are_not_cached(self):
+        self.client.get(reverse('product-detail', args=[0]))
+
+        res = self.client.get(reverse('product-detail', args=[0]))
+        self.assertEqual(res.status_code, 404)
+        self.assertNotEqual(res.get('X-Cache'), 'HIT')
+
+
+class ConditionalGetTests(TestCase):
+    """Tests for ETag and Last-Modified handling of catalogue reads."""
+
+    def setUp(self):
+        get_cache().clear()
+        self.merchant = create_user('merchant@example.com', is_merchant=True)
+        self.category = Category.objects.create(name='Books')
+        self.product = create_product(self.merchant, self.category, name='Book')
+        self.client = APIClient()
+
+    def test_detail_not_modified_skips_serializer(self):
+        url = reverse('product-detail', args=[self.product.id])
+        res = self.client.get(url)
+        self.assertIn('ETag', res)
+        self.assertIn('Last-Modified', res)
+        get_cache().clear()
+
+        with mock.patch('store.views.ProductSerializer.to_representation') as mock_representation:
+            with CaptureQueriesContext(connection) as queries:
+                not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(len(queries), 1)
+        mock_representation.assert_not_called()
+
+    def test_detail_if_modified_since(self):
+        url = reverse('product-detail', args=[self.product.id])
+        res = self.client.get(url)
+
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=res['Last-Modified']).status_code, 304)
+
+    def test_detail_etag_changes_on_update(self):
+        url = reverse('product-detail', args=[self.product.id])
+        etag = self.client.get(url)['ETag']
+
+        Product.objects.filter(id=self.product.id).update(price=Decimal('99.00'), updated_at=timezone.now() + timedelta(seconds=1))
+        get_cache().clear()
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_list_not_modified_from_cache(self):
+        etag = self.client.get(reverse('product-list'))['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(len(queries), 0)
+
+    def test_list_etag_changes_on_delete(self):
+        other = create_product(self.merchant, self.category, name='Other')
+        res = self.client.get(reverse('product-list'))
+        self.assertNotIn('Last-Modified', res)
+
+        Product.objects.filter(id=other.id).delete()
+        get_cache().clear()
+
+        self.assertEqual(self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=res['ETag']).status_code, 200)
+
+    @override_settings(STORE_RESPONSE_CACHE_TIMEOUT=0)
+    def test_list_validators_do_not_scan_the_catalogue(self):
+        for name in ('product-list', 'product-list-async'):
+            with self.subTest(name=name):
+                url = reverse(name)
+                with CaptureQueriesContext(connection) as queries:
+                    etag = self.client.get(url, {'pagination': 'cursor'})['ETag']
+                self.assertFalse([query for query in queries if 'COUNT(' in query['sql'] or 'MAX(' in query['sql']])
+
+                with CaptureQueriesContext(connection) as queries:
+                    res = self.client.get(url, {'pagination': 'cursor'}, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(res.status_code, 304)
+                self.assertEqual(len(queries), 0)
+
+    def test_list_etag_changes_on_update(self):
+        etag = self.client.get(reverse('product-list'))['ETag']
+
+        self.product.name = 'Renamed'
+        self.product.save()
+
+        self.assertEqual(self.client.get(reverse('product-list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_etag_depends_on_query(self):
+        etag = self.client.get(reverse('product-list'))['ETag']
+
+        self.assertNotEqual(self.client.get(reverse('product-list'), {'ordering': 'price'})['ETag'], etag)
+
+
+class ProductSearchTests(TestCase):
+    """Tests for the full-text product search endpoint."""
+
+    def setUp(self):
+        get_cache().clear()
+        self.merchant = create_user('merchant@example.com', is_merchant=True)
+        self.category = Category.objects.create(name='Books')
+        self.client = APIClient()
+
+    def search(self, query, **params):
+        return self.client.get(reverse('product-search'), {'q': query, **params})
+
+    def result_names(self, query):
+        return [product['name'] for product in self.search(query).data['results']]
+
+    def test_name_matches_rank_above_description_matches(self):
+        Product.objects.create(
+            merchant=self.merchant, category=self.category, price=1,
+            name='Notebook', description='A guitar songbook notebook',
+        )
+        create_product(self.merchant, self.category, name='Electric guitar')
+        create_product(self.merchant, self.category, name='Piano')
+
+        self.assertEqual(self.result_names('guitar'), ['Electric guitar', 'Notebook'])
+
+    def test_prefix_and_multiple_words(self):
+        create_product(self.merchant, self.category, name='Acoustic guitar')
+        create_product(self.merchant, self.category, name='Electric guitar')
+
+        self.assertEqual(self.result_names('acoustic guit'), ['Acoustic guitar'])
+
+    def test_query_syntax_is_escaped(self):
+        create_product(self.merchant, self.category, name='Guitar')
+
+        res = self.search('"guitar*: ^(')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([product['name'] for product in res.data['results']], ['Guitar'])
+
+    def test_index_follows_updates_and_deletes(self):
+        product = create_product(self.merchant, self.category, name='Guitar')
+        product.name = product.description = 'Violin'
+        product.save()
+
+        self.assertEqual(self.result_names('guitar'), [])
+        self.assertEqual(self.result_names('violin'), ['Violin'])
+
+        product.delete()
+        self.assertEqual(self.result_names('violin'), [])
+
+    def test_results_are_paginated(self):
+        for i in range(12):
+            create_product(self.merchant, self.category, name=f'Guitar {i}')
+
+        res = self.search('guitar', page=2)
+
+        self.assertEqual(res.data['count'], 12)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_missing_query(self):
+        self.assertEqual(self.client.get(reverse('product-search')).status_code, 400)
+
+    def test_rebuild_search_index(self):
+        create_product(self.merchant, self.category, name='Guitar')
+        get_search_backend().clear()
+        self.assertEqual(self.result_names('guitar'), [])
+        get_cache().clear()
+
+        call_command('rebuild_search_index', stdout=StringIO())
+
+        self.assertEqual(self.result_names('guitar'), ['Guitar'])
+
+
+class BenchmarkTests(TestCase):
+    """Tests for the fixture generator and the benchmark runner."""
+
+    def seed_snapshot(self, seed):
+        with transaction.atomic():
+            seed_store(customers=5, merchants=2, categories=3, products=20, orders=10, seed=seed)
+            snapshot = (
+                list(Product.objects.order_by('id').values_list('name', 'price', 'merchant__email', 'category__name')),
+                list(Order.objects.order_by('id').values_list('customer__email', 'order_date', 'total_price')),
+                list(OrderItem.objects.order_by('id').values_list('product__name', 'quantity')),
+                list(ProductDailySales.objects.order_by('day', 'product__name').values_list('product__name', 'day', 'units')),
+            )
+            transaction.set_rollback(True)
+        return snapshot
+
+    def test_seed_store_is_deterministic(self):
+        first = self.seed_snapshot(seed=1)
+
+        self.assertEqual(len(first[0]), 20)
+        self.assertEqual(first, self.seed_snapshot(seed=1))
+        self.assertNotEqual(first, self.seed_snapshot(seed=2))
+
+    def test_run_benchmarks(self):
+        seed_store(customers=5, merchants=2, categories=3, products=30, orders=10)
+
+        results = run_benchmarks(['product-list', 'create-order'], iterations=3, warmup=1)
+
+        self.assertEqual(set(results), {'product-list', 'create-order'})
+        for result in results.values():
+            self.assertEqual(result['requests'], 3)
+            self.assertEqual(set(result), {'requests', 'latency_ms', 'queries', 'peak_allocated_kib'})
+            self.assertGreater(result['queries']['p50'], 0)
+
+    def test_serializer_benchmark(self):
+        # Timings are only reported by bench_store; here the compared paths must agree.
+        seed_store(customers=5, merchants=2, categories=3, products=30, orders=1)
+        context = {'request': Request(APIClient().get(reverse('product-list')).wsgi_request)}
+        instances = Product.objects.order_by('id')[:KeysetPagination.page_size]
+        rows = Product.objects.order_by('id').values(*ProductRowSerializer.value_fields)[:KeysetPagination.page_size]
+
+        with CaptureQueriesContext(connection) as model_queries:
+            expected = ProductSerializer(list(instances), many=True, context=context).data
+        with CaptureQueriesContext(connection) as row_queries:
+            data = ProductRowSerializer(list(rows), many=True, context=context).data
+
+        self.assertEqual(data, expected)
+        self.assertEqual(len(row_queries), 1)
+        self.assertEqual(len(model_queries), 1)
+
+        results = run_serializer_benchmark(iterations=2)
+        self.assertEqual(set(results), {'serialize', 'fetch_and_serialize'})
+        for result in results.values():
+            self.assertEqual(set(result), {'model_serializer_ms', 'row_serializer_ms', 'speedup'})
+
+    def test_benchmark_scenarios_return_success(self):
+        seed_store(customers=5, merchants=2, categories=3, products=30, orders=10)
+
+        results = run_benchmarks(iterations=1, warmup=0)
+
+        self.assertEqual(set(results), set(SCENARIOS))
+
+
+class RequestMetricsTests(TestCase):
+    """Tests for the request metrics middleware and endpoint."""
+
+    def setUp(self):
+        get_cache().clear()
+        registry.reset()
+        merchant = create_user('merchant@example.com', is_merchant=True)
+        category = Category.objects.create(name='Books')
+        for i in range(3):
+            create_product(merchant, category, name=f'Product {i}')
+        self.admin = User.objects.create_superuser('admin@example.com', 'testpass123')
+        self.client = APIClient()
+
+    def metrics(self):
+        self.client.force_authenticate(self.admin)
+        res = self.client.get(reverse('metrics'))
+        self.client.force_authenticate(None)
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res['Content-Type'].startswith('text/plain'))
+        return res.content.decode()
+
+    def test_records_per_endpoint_metrics(self):
+        self.client.get(reverse('product-list'))
+        self.client.get(reverse('product-list'))
+
+        body = self.metrics()
+
+        self.assertIn('http_requests_total{endpoint="product-list",method="GET",status="200"} 2', body)
+        self.assertIn('http_request_duration_seconds_count{endpoint="product-list",method="GET"} 2', body)
+        self.assertIn('http_request_db_queries_bucket{endpoint="product-list",method="GET",le="+Inf"} 2', body)
+        self.assertIn('store_response_cache_lookups_total{result="hit"}', body)
+        serializer_seconds = next(
+            float(line.rsplit(' ', 1)[1]) for line in body.splitlines()
+            if line.startswith('http_request_serializer_duration_seconds_sum{endpoint="product-list"')
+        )
+        self.assertGreater(serializer_seconds, 0)
+
+    def test_counts_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('product-list'))
+
+        self.assertIn(
+            f'http_request_db_queries_sum{{endpoint="product-list",method="GET"}} {len(queries)}',
+            self.metrics(),
+        )
+
+    def test_metrics_endpoint_is_admin_only(self):
+        self.client.force_authenticate(create_user())
+
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    def test_logs_requests_over_budget(self):
+        with self.settings(METRICS_QUERY_BUDGET=0):
+            with self.assertLogs('app.metrics', 'WARNING') as logs:
+                self.client.get(reverse('product-list'))
+
+        self.assertIn('product-list', logs.output[0])
+
+
+class ProductImportTests(TestCase):
+    """Tests for the bulk product import."""
+
+    def setUp(self):
+        self.merchant = create_user('merchant@example.com', is_merchant=True)
+        self.books = Category.objects.create(name='Books')
+        self.games = Category.objects.create(name='Games')
+        self.client = APIClient()
+        self.client.force_authenticate(self.merchant)
+
+    def csv_lines(self, *rows):
+        header = 'sku,name,description,price,category,image'
+        return [f'{line}\n'.encode() for line in (header, *rows)]
+
+    def test_import_creates_and_updates_by_sku(self):
+        existing = create_product(self.merchant, self.books, name='Old name', sku='A-1')
+        other_merchant = create_user('other@example.com', is_merchant=True)
+        create_product(other_merchant, self.books, name='Other', sku='B-1')
+
+        report = import_products(self.merchant, self.csv_lines(
+            'A-1,New name,Updated,12.50,Games,',
+            'B-1,Mine,"Multi-word, quoted",3.00,Books,',
+        ))
+
+        self.assertEqual(report, {'processed': 2, 'imported': 2, 'failed': 0, 'errors': []})
+        existing.refresh_from_db()
+        self.assertEqual((existing.name, existing.price, existing.category), ('New name', Decimal('12.50'), self.games))
+        self.assertEqual(self.merchant.products.get(sku='B-1').description, 'Multi-word, quoted')
+        self.assertEqual(Product.objects.get(merchant=other_merchant).name, 'Other')
+
+    def test_import_reports_row_errors(self):
+        report = import_products(self.merchant, self.csv_lines(
+            'A-1,Valid,Description,1.00,Books,',
+            'A-2,Bad price,Description,cheap,Books,',
+            'A-3,Bad category,Description,1.00,Toys,',
+        ), chunk_size=2)
+
+        self.assertEqual((report['processed'], report['imported'], report['failed']), (3, 1, 2))
+        self.assertEqual([error['row'] for error in report['errors']], [2, 3])
+        self.assertIn('price', report['errors'][0]['errors'])
+        self.assertIn('category', report['errors'][1]['errors'])
+
+    def test_import_query_count_per_chunk_is_constant(self):
+        rows = [f'S-{i},Product {i},Description,1.00,Books,' for i in range(40)]
+
+        with CaptureQueriesContext(connection) as small:
+            import_products(self.merchant, self.csv_lines(*rows[:20]), chunk_size=20)
+        with CaptureQueriesContext(connection) as large:
+            import_products(self.merchant, self.csv_lines(*rows), chunk_size=40)
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(self.merchant.products.count(), 40)
+
+    @mock.patch('store.importing.generate_product_renditions_batch')
+    def test_import_queues_changed_images(self, mock_renditions):
+        create_product(self.merchant, self.books, sku='A-1', image='product_images/a.jpg')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            import_products(self.merchant, self.csv_lines(
+                'A-1,Same image,Description,1.00,Books,product_images/a.jpg',
+                'A-2,New image,Description,1.00,Books,product_images/b.jpg',
+                'A-3,No image,Description,1.00,Books,',
+            ))
+
+        mock_renditions.delay.assert_called_once_with([self.merchant.products.get(sku='A-2').id])
+
+    def test_reimport_without_image_column_keeps_images(self):
+        create_product(self.merchant, self.books, sku='A-1', image='product_images/a.jpg')
+        lines = [f'{line}\n'.encode() for line in (
+            'sku,name,description,price,category',
+            'A-1,Renamed,Description,2.00,Books',
+        )]
+        ndjson = [json.dumps({
+            'sku': 'A-1', 'name': 'Renamed again', 'description': 'Description', 'price': '3.00', 'category': 'Books',
+        }).encode()]
+
+        import_products(self.merchant, lines)
+        import_products(self.merchant, ndjson, file_format='ndjson')
+
+        product = self.merchant.products.get(sku='A-1')
+        self.assertEqual((product.name, product.image.name), ('Renamed again', 'product_images/a.jpg'))
+
+        import_products(self.merchant, self.csv_lines('A-1,Cleared,Description,3.00,Books,'))
+        self.assertEqual(self.merchant.products.get(sku='A-1').image.name, '')
+
+    def test_import_endpoint_ndjson_stream(self):
+        body = '\n'.join([
+            json.dumps({'sku': 'N-1', 'name': 'Guitar', 'description': 'Electric', 'price': '99.00', 'category': 'Games'}),
+            'not json',
+        ])
+
+        res = self.client.generic('POST', reverse('product-import'), body, content_type='application/x-ndjson')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data['imported'], res.data['failed']), (1, 1))
+        self.assertEqual(self.client.get(reverse('product-search'), {'q': 'guitar'}).data['count'], 1)
+
+    def test_import_endpoint_csv_upload(self):
+        upload = SimpleUploadedFile('products.csv', b''.join(self.csv_lines('C-1,Book,Description,5.00,Books,')))
+
+        res = self.client.post(reverse('product-import'), {'file': upload}, format='multipart')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['imported'], 1)
+
+    def test_import_endpoint_file_format_override(self):
+        upload = SimpleUploadedFile('products.txt', json.dumps({
+            'sku': 'N-1', 'name': 'Book', 'description': 'Paperback', 'price': '5.00', 'category': 'Books',
+        }).encode())
+
+        res = self.client.post(f"{reverse('product-import')}?file_format=ndjson", {'file': upload}, format='multipart')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data['imported'], 1)
+
+    def test_import_endpoint_requires_merchant(self):
+        self.client.force_authenticate(create_user())
+
+        self.assertEqual(self.client.post(reverse('product-import')).status_code, 403)
+
+    def test_import_products_command(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv') as csv_file:
+            csv_file.writelines(self.csv_lines('C-1,Book,Description,5.00,Books,'))
+            csv_file.flush()
+            call_command('import_products', self.merchant.email, csv_file.name, stdout=StringIO())
+
+        self.assertTrue(self.merchant.products.filter(sku='C-1').exists())
+
+
+class OrderExportTests(TestCase):
+    """Tests for the streaming order line export."""
+
+    def setUp(self):
+        self.merchant = create_user('merchant@example.com', is_merchant=True)
+        self.other_merchant = create_user('other@example.com', is_merchant=True)
+        customer = create_user('customer@example.com')
+        category = Category.objects.create(name='Books')
+        self.product = create_product(self.merchant, category, name='Book, paperback', price='2.50', sku='B-1')
+        other_product = create_product(self.other_merchant, category, name='Other')
+        for day in (1, 2, 3):
+            order = Order.objects.create_with_items(
+                customer, [(self.product, day), (other_product, 1)], delivery_address='Main Street 1',
+            )
+            Order.objects.filter(pk=order.pk).update(order_date=timezone.make_aware(timezone.datetime(2024, 3, day, 23)))
+        self.client = APIClient()
+        self.client.force_authenticate(self.merchant)
+
+    def export(self, **params):
+        return self.client.get(reverse('order-export'), {'date_from': '2024-03-01', 'date_to': '2024-03-02', **params})
+
+    def test_export_csv(self):
+        res = self.export()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.reader(b''.join(res.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][0], 'order_id')
+        self.assertEqual([row[6:] for row in rows[1:]], [
+            ['Book, paperback', '1', '2.50', '2.50'],
+            ['Book, paperback', '2', '2.50', '5.00'],
+        ])
+
+    def test_export_ndjson(self):
+        res = self.export(file_format='ndjson')
+
+        lines = [json.loads(line) for line in b''.join(res.streaming_content).splitlines()]
+        self.assertEqual([(line['sku'], line['quantity'], line['line_total']) for line in lines], [
+            ('B-1', 1, '2.50'),
+            ('B-1', 2, '5.00'),
+        ])
+
+    def test_export_rejects_invalid_parameters(self):
+        self.assertEqual(self.export(date_to='March').status_code, 400)
+        self.assertEqual(self.export(file_format='xlsx').status_code, 400)
+
+    def test_export_requires_merchant(self):
+        self.client.force_authenticate(create_user())
+
+        self.assertEqual(self.export().status_code, 403)
+
+    def test_export_orders_command(self):
+        out = StringIO()
+
+        call_command('export_orders', self.merchant.email, '2024-03-01', '2024-03-31', '--chunk-size', '2', stdout=out)
+
+        self.assertEqual(len(out.getvalue().splitlines()), 4)
+
+
+
+
+class ProductRowSerializerTests(TestCase):
+    """Tests for the product list row serializer."""
+
+    def setUp(self):
+        get_cache().clear()
+        merchant = create_user('merchant@example.com', is_merchant=True)
+        category = Category.objects.create(name='Books')
+        create_product(merchant, category, name='Plain', price='10.00')
+        create_product(merchant, category, name='Illustrated', price='0.50', sku='I-1',
+                       image='product_images/a b.jpg', thumbnail='product_thumbnails/a b.jpg')
+        create_product(merchant, category, name='Ünïcode', price='12345678.99', image='product_images/ü.png')
+
+    def test_matches_product_serializer(self):
+        request = APIClient().get(reverse('product-list')).wsgi_request
+        for context in ({'request': Request(request)}, {}):
+            with self.subTest(request='request' in context):
+                expected = ProductSerializer(Product.objects.order_by('id'), many=True, context=context).data
+                rows = Product.objects.order_by('id').values(*ProductRowSerializer.value_fields)
+
+                self.assertEqual(ProductRowSerializer(rows, many=True, context=context).data, expected)
+
+    def test_product_list_renders_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            res = APIClient().get(reverse('product-list'))
+
+        self.assertEqual(len(res.data['results']), 3)
+        self.assertEqual(res.data['results'][1]['image'], 'http://testserver/media/product_images/a%20b.jpg')
+        self.assertNotIn('"user_user"', ' '.join(query['sql'] for query in queries))
+
+
+class AsyncCatalogueTests(TestCase):
+    """Tests for the async catalogue read endpoints."""
+
+    def setUp(self):
+        get_cache().clear()
+        self.merchant = create_user('merchant@example.com', is_merchant=True)
+        self.category = Category.objects.create(name='Books')
+        self.products = [
+            create_product(self.merchant, self.category, name=f'Product {i}', price=f'{i % 4}.50')
+            for i in range(15)
+        ]
+        self.client = APIClient()
+
+    def assertSameResponse(self, sync_url, async_url, params=None):
+        sync_res = self.client.get(sync_url, params)
+        get_cache().clear()
+        async_res = self.client.get(async_url, params)
+
+        self.assertEqual(async_res.status_code, sync_res.status_code)
+        self.assertEqual(async_res.json(), json.loads(sync_res.content.decode().replace(sync_url, async_url)))
+        return async_res
+
+    def test_views_are_async(self):
+        for name, args in (('category-list-async', []), ('product-list-async', []), ('product-detail-async', [1])):
+            self.assertTrue(asyncio.iscoroutinefunction(resolve(reverse(name, args=args)).func))
+
+    def test_product_list_matches_sync_view(self):
+        for params in ({}, {'page': 2}, {'ordering': '-price'}, {'category': self.category.id},
+                       {'count': 'false', 'page': 2}, {'pagination': 'cursor', 'ordering': 'price'},
+                       {'page': 5}, {'cursor': 'invalid'}):
+            with self.subTest(params=params):
+                self.assertSameResponse(reverse('product-list'), reverse('product-list-async'), params)
+
+    def test_product_detail_and_categories_match_sync_views(self):
+        product = self.products[0]
+        self.assertSameResponse(reverse('product-detail', args=[product.id]), reverse('product-detail-async', args=[product.id]))
+        self.assertSameResponse(reverse('product-detail', args=[0]), reverse('product-detail-async', args=[0]))
+        self.assertSameResponse(reverse('category-list'), reverse('category-list-async'))
+
+    def test_conditional_and_cached_responses(self):
+        url = reverse('product-detail-async', args=[self.products[0].id])
+        first = self.client.get(url)
+
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        get_cache().clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+    def test_authenticates_like_sync_view(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        for name, args in (('category-list', []), ('product-list', []), ('product-detail', [self.products[0].id])):
+            with self.subTest(name=name):
+                sync_res = self.client.get(reverse(name, args=args))
+                async_res = self.client.get(reverse(f'{name}-async', args=args))
+
+                self.assertEqual(async_res.status_code, 401)
+                self.assertEqual(async_res.json(), sync_res.json())
+                self.assertEqual(async_res['WWW-Authenticate'], sync_res['WWW-Authenticate'])
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.merchant).key}')
+        self.assertEqual(self.client.get(reverse('product-list-async')).status_code, 200)
+
+    def test_applies_permissions_and_throttles_of_sync_view(self):
+        class OncePerMinute(AnonRateThrottle):
+            rate = '1/min'
+
+        with mock.patch.object(ProductListView, 'permission_classes', [IsAuthenticated]):
+            sync_res = self.client.get(reverse('product-list'))
+            async_res = self.client.get(reverse('product-list-async'))
+        self.assertEqual(async_res.status_code, 401)
+        self.assertEqual(async_res.json(), sync_res.json())
+
+        with mock.patch.object(ProductListView, 'throttle_classes', [OncePerMinute]):
+            self.assertEqual(self.client.get(reverse('product-list-async')).status_code, 200)
+            res = self.client.get(reverse('product-list-async'))
+        self.assertEqual(res.status_code, 429)
+        self.assertIn('Retry-After', res)
+
+    def test_writes_are_handled_by_sync_view(self):
+        self.client.force_authenticate(self.merchant)
+
+        res = self.client.post(reverse('category-list-async'), {'name': 'Games'})
+
+        self.assertEqual(res.status_code, 201)
+        self.assertTrue(Category.objects.filter(name='Games').exists())
+
+    async def test_asgi_request_records_metrics(self):
+        registry.reset()
+
+        res = await self.async_client.get(reverse('product-list-async'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.json()['results']), 10)
+        histogram = registry.histograms[('http_request_db_queries', 'product-list-async', 'GET')]
+        self.assertEqual(histogram.count, 1)
+        self.assertGreater(histogram.sum, 0)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are asserted for SQLite.')
+class HotQueryIndexTests(TestCase):
+    """Check that the hot queries are answered from indexes rather than full scans."""
+
+    def assertUsesIndexes(self, queryset, *index_names):
+        plan = queryset.explain()
+        for index_name in index_names:
+            self.assertIn(f'INDEX {index_name} ', plan)
+        self.assertNotIn('SCAN ', plan)
+
+    def test_order_date_range(self):
+        now = timezone.now()
+        queryset = Order.objects.filter(order_date__gte=now - timedelta(days=7), order_date__lt=now)
+
+        self.assertUsesIndexes(queryset, 'store_order_date_idx')
+
+    def test_customer_orders_newest_first(self):
+        queryset = Order.objects.filter(customer_id=1).order_by('-order_date')
+
+        self.assertUsesIndexes(queryset, 'store_order_customer_date_idx')
+
+    def test_order_items_of_orders(self):
+        queryset = OrderItem.objects.filter(order_id__in=[1, 2]).values('order_id', 'product_id', 'quantity')
+
+        self.assertUsesIndexes(queryset, 'store_orderitem_order_prod_idx')
+
+    def test_merchant_products_by_category_and_price(self):
+        queryset = Product.objects.filter(merchant_id=1, category_id=1).order_by('price')
+
+        self.assertUsesIndexes(queryset, 'store_product_merch_cat_idx')
+
+    def test_product_statistics(self):
+        queryset = ProductDailySales.objects.filter(
+            merchant_id=1, day__range=('2024-01-01', '2024-01-31'),
+        ).values('product').annotate(total_ordered=Sum('units'))
+
+        self.assertUsesIndexes(queryset, 'store_sales_merchant_day_idx')
+
+    def test_order_export(self):
+        merchant = create_user('merchant@example.com', is_merchant=True)
+        queryset = export_queryset(merchant, timezone.localdate(), timezone.localdate())
+
+        self.assertUsesIndexes(queryset, 'store_product_merch_cat_idx')
+        self.assertRegex(queryset.explain(), r'SEARCH store_orderitem USING (COVERING )?INDEX')
+
+
+class CartTests(TestCase):
+    """Tests for the cache-backed shopping cart."""
+
+    def setUp(self):
+        get_cache().clear()
+        self.merchant = create_user('merchant@example.com', is_merchant=True)
+        self.customer = create_user('customer@example.com')
+        category = Category.objects.create(name='Books')
+        self.products = [create_product(self.merchant, category, name=f'Book {i}', price=f'{i + 1}.25') for i in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def add(self, product, quantity=1):
+        return self.client.post(reverse('cart-items'), {'product': product.id, 'quantity': quantity})
+
+    def test_add_update_remove_and_view(self):
+        self.assertEqual(self.add(self.products[0], 2).data, {'product': self.products[0].id, 'quantity': 2})
+        self.assertEqual(self.add(self.products[0]).data['quantity'], 3)
+        self.add(self.products[1])
+        self.add(self.products[2])
+        self.client.put(reverse('cart-item', args=[self.products[1].id]), {'quantity': 5})
+        self.client.delete(reverse('cart-item', args=[self.products[2].id]))
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(reverse('cart'))
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(res.data['items'], [
+            {'product': self.products[0].id, 'name': 'Book 0', 'price': '1.25', 'quantity': 3, 'line_total': '3.75'},
+            {'product': self.products[1].id, 'name': 'Book 1', 'price': '2.25', 'quantity': 5, 'line_total': '11.25'},
+        ])
+        self.assertEqual((res.data['item_count'], res.data['total_price']), (8, '15.00'))
+
+    def test_cart_operations_do_not_write_to_database(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.add(self.products[0])
+            self.client.put(reverse('cart-item', args=[self.products[0].id]), {'quantity': 4})
+            self.client.delete(reverse('cart-item', args=[self.products[0].id]))
+            self.client.delete(reverse('cart'))
+
+        self.assertTrue(all(query['sql'].startswith('SELECT') for query in queries))
+
+    def test_invalid_items_are_rejected(self):
+        self.assertEqual(self.client.post(reverse('cart-items'), {'product': 0}).status_code, 400)
+        self.assertEqual(self.add(self.products[0], 0).status_code, 400)
+        self.assertEqual(self.client.put(reverse('cart-item', args=[0]), {'quantity': 1}).status_code, 400)
+
+    @override_settings(STORE_CART_MAX_ITEMS=2)
+    def test_cart_size_is_limited(self):
+        self.add(self.products[0])
+        self.add(self.products[1])
+
+        self.assertEqual(self.add(self.products[2]).status_code, 400)
+        self.assertEqual(self.add(self.products[1]).status_code, 200)
+
+    def test_deleted_products_are_dropped(self):
+        self.add(self.products[0])
+        self.add(self.products[1])
+        self.products[1].delete()
+
+        self.assertEqual([item['product'] for item in self.client.get(reverse('cart')).data['items']], [self.products[0].id])
+
+    def test_carts_are_per_user(self):
+        self.add(self.products[0])
+        self.client.force_authenticate(create_user('other@example.com'))
+
+        self.assertEqual(self.client.get(reverse('cart')).data['items'], [])
+
+    def test_checkout(self):
+        self.add(self.products[0], 2)
+        self.add(self.products[2])
+
+        res = self.client.post(reverse('cart-checkout'), {'delivery_address': 'Main Street 1'})
+
+        self.assertEqual(res.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual((order.customer, order.total_price), (self.customer, Decimal('5.75')))
+        self.assertEqual(sorted(order.items.values_list('product_id', 'quantity')), [(self.products[0].id, 2), (self.products[2].id, 1)])
+        self.assertEqual(self.client.get(reverse('cart')).data['items'], [])
+        self.assertEqual(self.client.post(reverse('cart-checkout'), {'delivery_address': 'Main Street 1'}).status_code, 400)
+
+    def test_failed_checkout_keeps_cart(self):
+        self.add(self.products[0], 2)
+
+        with mock.patch.object(Order.objects, 'create_with_items', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse('cart-checkout'), {'delivery_address': 'Main Street 1'})
+
+        self.assertEqual(self.client.get(reverse('cart')).data['item_count'], 2)
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+
+        self.assertEqual(self.client.get(reverse('cart')).status_code, 401)
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis-py client commands used by RedisCart.
+
+    Pipelines buffer commands until execute(), except between watch() and
+    multi(), and fail with WatchError when a watched key changed meanwhile.
+    Callables in after_hlen run, one per HLEN, right after it, to interleave
+    a concurrent client between a cart's size check and its write.
+    """
+
+    def __init__(self):
+        self.hashes = {}
+        self.versions = Counter()
+        self.after_hlen = []
+
+    def changed(self, key):
+        self.versions[key] += 1
+
+    def hgetall(self, key):
+        return {str(field).encode(): str(value).encode() for field, value in self.hashes.get(key, {}).items()}
+
+    def hlen(self, key):
+        size = len(self.hashes.get(key, {}))
+        if self.after_hlen:
+            self.after_hlen.pop(0)()
+        return size
+
+    def hexists(self, key, field):
+        return field in self.hashes.get(key, {})
+
+    def hincrby(self, key, field, amount):
+        self.changed(key)
+        fields = self.hashes.setdefault(key, {})
+        fields[field] = fields.get(field, 0) + amount
+        return fields[field]
+
+    def hset(self, key, field, value):
+        self.changed(key)
+        fields = self.hashes.setdefault(key, {})
+        added = field not in fields
+        fields[field] = value
+        return int(added)
+
+    def hdel(self, key, field):
+        self.changed(key)
+        return int(self.hashes.get(key, {}).pop(field, None) is not None)
+
+    def delete(self, key):
+        self.changed(key)
+        return int(self.hashes.pop(key, None) is not None)
+
+    def expire(self, key, seconds):
+        return key in self.hashes
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def transaction(self, func, *watches):
+        while True:
+            pipeline = self.pipeline()
+            pipeline.watch(*watches)
+            func(pipeline)
+            try:
+                return pipeline.execute()
+            except WatchError:
+                continue
+
+
+class FakePipeline:
+
+    def __init__(self, client):
+        self.client = client
+        self.watched = {}
+        self.immediate = False
+        self.commands = []
+
+    def watch(self, *keys):
+        self.watched = {key: self.client.versions[key] for key in keys}
+        self.immediate = True
+
+    def multi(self):
+        self.immediate = False
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+
+        def call(*args):
+            if self.immediate:
+                return command(*args)
+            self.commands.append((command, args))
+            return self
+
+        return call
+
+    def execute(self):
+        commands, watched = self.commands, self.watched
+        self.commands, self.watched, self.immediate = [], {}, False
+        if any(self.client.versions[key] != version for key, version in watched.items()):
+            raise WatchError
+        return [command(*args) for command, args in commands]
+
+
+@override_settings(
+    CACHES={
+        **settings.CACHES,
+        'carts': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379'},
+    },
+    STORE_CART_CACHE_ALIAS='carts',
+    STORE_CART_MAX_ITEMS=2,
+)
+class RedisCartTests(TestCase):
+    """Tests for carts on Redis, run against FakeRedis."""
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        patcher = mock.patch('django.core.cache.backends.redis.RedisCacheClient.get_client', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.customer = create_user('customer@example.com')
+        category = Category.objects.create(name='Books')
+        merchant = create_user('merchant@example.com', is_merchant=True)
+        self.products = [create_product(merchant, category, name=f'Book {i}') for i in range(3)]
+        self.cart = get_cart(self.customer)
+
+    def test_is_stored_as_hash(self):
+        self.assertIsInstance(self.cart, RedisCart)
+        self.assertEqual(self.cart.add(self.products[0].id, 2), 2)
+        self.assertEqual(self.cart.add(self.products[0].id, 1), 3)
+        self.cart.set(self.products[1].id, 5)
+        self.assertEqual(self.cart.items(), {self.products[0].id: 3, self.products[1].id: 5})
+
+        self.cart.remove(self.products[1].id)
+        self.assertEqual(self.cart.take(), {self.products[0].id: 3})
+        self.assertEqual(self.cart.items(), {})
+
+    def test_checkout(self):
+        self.cart.add(self.products[0].id, 2)
+        client = APIClient()
+        client.force_authenticate(self.customer)
+
+        res = client.post(reverse('cart-checkout'), {'delivery_address': 'Main Street 1'})
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(list(Order.objects.get().items.values_list('product_id', 'quantity')), [(self.products[0].id, 2)])
+        self.assertEqual(self.cart.items(), {})
+
+    def test_max_items(self):
+        self.cart.add(self.products[0].id, 1)
+        self.cart.set(self.products[1].id, 1)
+
+        with self.assertRaises(CartFull):
+            self.cart.add(self.products[2].id, 1)
+        with self.assertRaises(CartFull):
+            self.cart.set(self.products[2].id, 1)
+        self.cart.add(self.products[0].id, 1)
+        self.cart.set(self.products[1].id, 4)
+
+    def test_concurrent_adds_do_not_exceed_max_items(self):
+        self.cart.add(self.products[0].id, 1)
+        other_cart = get_cart(self.customer)
+        self.redis.after_hlen.append(lambda: other_cart.add(self.products[1].id, 1))
+
+        with self.assertRaises(CartFull):
+            self.cart.add(self.products[2].id, 1)
+        self.assertEqual(self.cart.items(), {self.products[0].id: 1, self.products[1].id: 1})
+
+
+class StockTests(TestCase):
+    """Tests for stock reservation at order creation."""
+
+    def setUp(self):
+        get_cache().clear()
+        self.merchant = create_user('merchant@example.com', is_merchant=True)
+        self.customer = create_user('customer@example.com')
+        category = Category.objects.create(name='Books')
+        self.tracked = create_product(self.merchant, category, name='Tracked', stock=5)
+        self.other = create_product(self.merchant, category, name='Other', stock=1)
+        self.untracked = create_product(self.merchant, category, name='Untracked')
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def post_order(self, *items):
+        return self.client.post(reverse('create-order'), {
+            'delivery_address': 'Main Street 1',
+            'items': [{'product': product.id, 'quantity': quantity} for product, quantity in items],
+        }, format='json')
+
+    def test_order_decrements_stock(self):
+        res = self.post_order((self.tracked, 2), (self.tracked, 1), (self.untracked, 10))
+
+        self.assertEqual(res.status_code, 201)
+        self.tracked.refresh_from_db()
+        self.untracked.refresh_from_db()
+        self.assertEqual(self.tracked.stock, 2)
+        self.assertIsNone(self.untracked.stock)
+
+    def test_insufficient_stock_creates_nothing(self):
+        res = self.post_order((self.tracked, 2), (self.other, 2))
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data['items'], [f'Only 1 unit(s) of product {self.other.id} left in stock.'])
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.tracked.pk).stock, 5)
+
+    def test_order_invalidates_catalogue_responses(self):
+        list_url, detail_url = reverse('product-list'), reverse('product-detail', args=[self.tracked.id])
+        self.client.get(detail_url)
+        with self.settings(STORE_RESPONSE_CACHE_TIMEOUT=0):
+            etag = self.client.get(list_url)['ETag']
+
+            self.post_order((self.tracked, 3))
+
+            res = self.client.get(list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual({product['id']: product['stock'] for product in res.data['results']}[self.tracked.id], 2)
+        res = self.client.get(detail_url)
+        self.assertEqual((res['X-Cache'], res.data['stock']), ('MISS', 2))
+
+    def test_checkout_with_insufficient_stock_keeps_cart(self):
+        self.client.post(reverse('cart-items'), {'product': self.other.id, 'quantity': 3})
+
+        res = self.client.post(reverse('cart-checkout'), {'delivery_address': 'Main Street 1'})
+
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('error', res.data)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.client.get(reverse('cart')).data['item_count'], 3)
+
+
+class ConcurrentStockTests(TransactionTestCase):
+    """Concurrent orders for the last units of products must not oversell or deadlock.
+
+    On SQLite the orders run on a file-backed database of their own, since
+    the in-memory test database fails concurrent writers instead of making
+    them wait for the lock.
+    """
+    alias = 'default'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if connection.vendor != 'sqlite':
+            return
+        cls.alias = 'concurrent_stock'
+        cls.directory = tempfile.mkdtemp()
+        connections.settings[cls.alias] = {
+            **connections['default'].settings_dict,
+            'NAME': os.path.join(cls.directory, 'db.sqlite3'),
+            'TEST': {},
+        }
+        call_command('migrate', database=cls.alias, verbosity=0)
+
+    def tearDown(self):
+        if self.alias != 'default':
+            call_command('flush', database=self.alias, interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.alias != 'default':
+            connections[cls.alias].close()
+            del connections[cls.alias]
+            del connections.settings[cls.alias]
+            shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def place_orders(self, baskets):
+        """Place one order per basket of (product, quantity) from concurrent threads."""
+        customers = [
+            User.objects.db_manager(self.alias).create_user(f'customer{i}@example.com', 'testpass123')
+            for i in range(len(baskets))
+        ]
+        barrier = threading.Barrier(len(baskets))
+        results = []
+
+        def place_order(customer, basket):
+            barrier.wait()
+            try:
+                Order.objects.db_manager(self.alias).create_with_items(customer, basket, delivery_address='Main Street 1')
+                results.append('ordered')
+            except InsufficientStock:
+                results.append('short')
+            except Exception as error:
+                results.append(repr(error))
+            finally:
+                connections[self.alias].close()
+
+        with mock.patch('store.models.order_placed'):
+            threads = [
+                threading.Thread(target=place_order, args=(customer, basket))
+                for customer, basket in zip(customers, baskets)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return sorted(results)
+
+    def create_products(self, *stocks):
+        merchant = User.objects.db_manager(self.alias).create_user('merchant@example.com', 'testpass123', is_merchant=True)
+        category = Category.objects.using(self.alias).create(name='Books')
+        # Created in bulk to skip the search index signals, which write to the default database.
+        return Product.objects.using(self.alias).bulk_create([
+            Product(merchant=merchant, category=category, name=f'Product {i}', description='', price=Decimal('10.00'), stock=stock)
+            for i, stock in enumerate(stocks)
+        ])
+
+    def stock(self, products):
+        return list(Product.objects.using(self.alias).filter(pk__in=[p.pk for p in products]).order_by('pk').values_list('stock', flat=True))
+
+    def test_concurrent_orders_do_not_oversell(self):
+        products = self.create_products(5)
+
+        results = self.place_orders([[(products[0], 1)]] * 10)
+
+        self.assertEqual(results, ['ordered'] * 5 + ['short'] * 5)
+        self.assertEqual(Order.objects.using(self.alias).count(), 5)
+        self.assertEqual(self.stock(products), [0])
+
+    def test_orders_locking_products_in_conflicting_order(self):
+        products = self.create_products(6, 6, 6)
+        baskets = [
+            [(product, 1) for product in (products if i % 2 else products[::-1])]
+            for i in range(8)
+        ]
+
+        results = self.place_orders(baskets)
+
+        self.assertEqual(results, ['ordered'] * 6 + ['short'] * 2)
+        self.assertEqual(self.stock(products), [0, 0, 0])
+        self.assertEqual(OrderItem.objects.using(self.alias).count(), 18)
+
+
+class CustomerOrderHistoryTests(TestCase):
+    """Tests for the customer order history endpoint."""
+
+    def setUp(self):
+        merchant = create_user('merchant@example.com', is_merchant=True)
+        self.customer = create_user('customer@example.com')
+        category = Category.objects.create(name='Books')
+        self.products = [create_product(merchant, category, name=f'Book {i}', price=f'{i + 1}.00') for i in range(5)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def place_orders(self, count, items_per_order, customer=None):
+        items = [(product, 1) for product in self.products[:items_per_order]]
+        return [
+            Order.objects.create_with_items(customer or self.customer, items, delivery_address='Main Street 1')
+            for _ in range(count)
+        ]
+
+    def test_pages_cover_own_orders_newest_first(self):
+        orders = self.place_orders(25, 2)
+        self.place_orders(3, 1, customer=create_user('other@example.com'))
+        # Equal dates are ordered by id.
+        Order.objects.filter(pk__in=[order.pk for order in orders[5:10]]).update(order_date=orders[5].order_date)
+
+        ids = []
+        url = reverse('order-list')
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, 200)
+            ids.extend(order['id'] for order in res.data['results'])
+            url = res.data['next']
+
+        expected = Order.objects.filter(customer=self.customer).order_by('-order_date', '-id').values_list('id', flat=True)
+        self.assertEqual(ids, list(expected))
+        first = self.client.get(reverse('order-list')).data['results'][0]
+        self.assertEqual((first['item_count'], first['total_price']), (2, '3.00'))
+        self.assertEqual(first['items'], [
+            {'product': self.products[0].id, 'product_name': 'Book 0', 'quantity': 1, 'unit_price': '1.00'},
+            {'product': self.products[1].id, 'product_name': 'Book 1', 'quantity': 1, 'unit_price': '2.00'},
+        ])
+
+    def test_query_count_independent_of_order_and_item_count(self):
+        self.place_orders(2, 1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('order-list'))
+
+        self.place_orders(30, 5)
+        with CaptureQueriesContext(connection) as large:
+            res = self.client.get(reverse('order-list'))
+        with CaptureQueriesContext(connection) as next_page:
+            self.client.get(res.data['next'])
+
+        self.assertEqual(len(res.data['results']), 10)
+        self.assertEqual((len(small), len(large), len(next_page)), (2, 2, 2))
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+
+        self.assertEqual(self.client.get(reverse('order-list')).status_code, 401)
+
+
+class AdminChangelistTests(TestCase):
+    """Tests for the Order and Product admin changelists."""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin@example.com', 'testpass123')
+        self.merchant = create_user('merchant@example.com', is_merchant=True)
+        self.customers = [create_user(f'customer{i}@example.com') for i in range(3)]
+        category = Category.objects.create(name='Books')
+        self.products = [create_product(self.merchant, category, name=f'Book {i}') for i in range(3)]
+        self.client.force_login(self.admin)
+
+    def place_orders(self, count):
+        for i in range(count):
+            Order.objects.create_with_items(self.customers[i % 3], [(self.products[0], 1)], delivery_address='Main Street 1')
+
+    def get_changelist(self, name, **params):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(reverse(f'admin:store_{name}_changelist'), params)
+        self.assertEqual(res.status_code, 200)
+        return res, [query['sql'] for query in queries]
+
+    def test_order_changelist_queries_do_not_grow_with_rows(self):
+        self.place_orders(2)
+        _, small = self.get_changelist('order')
+        self.place_orders(20)
+        _, large = self.get_changelist('order')
+
+        self.assertEqual(len(small), len(large))
+
+    @skipUnless(connection.vendor == 'sqlite', 'Uses SQLite statistics.')
+    def test_unfiltered_count_is_estimated_from_statistics(self):
+        self.place_orders(3)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.execute("UPDATE sqlite_stat1 SET stat = '5000000 1' WHERE tbl = 'store_order'")
+
+        res, queries = self.get_changelist('order')
+        self.assertEqual(res.context['cl'].result_count, 5000000)
+        self.assertFalse(any('COUNT(' in sql and 'store_order' in sql for sql in queries))
+
+        today = timezone.localdate()
+        res, _ = self.get_changelist('order', order_date__year=today.year)
+        self.assertEqual(res.context['cl'].result_count, 3)
+
+    @skipUnless(connection.vendor == 'sqlite', 'Uses SQLite statistics.')
+    def test_small_tables_are_counted_exactly(self):
+        self.place_orders(3)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        res, _ = self.get_changelist('order')
+        self.assertEqual(res.context['cl'].result_count, 3)
+
+    def test_date_hierarchy_dates_match_distinct_dates(self):
+        self.place_orders(6)
+        now = timezone.now()
+        for order, days_ago in zip(Order.objects.order_by('id'), (0, 1, 40, 400, 401, 800)):
+            Order.objects.filter(pk=order.pk).update(order_date=now - timedelta(days=days_ago))
+        request = RequestFactory().get('/')
+        request.user = self.admin
+        queryset = site._registry[Order].get_queryset(request)
+
+        for kind in ('year', 'month', 'day'):
+            for order in ('ASC', 'DESC'):
+                self.assertEqual(
+                    list(queryset.datetimes('order_date', kind, order)),
+                    list(Order.objects.datetimes('order_date', kind, order)),
+                )
+        customer = self.customers[0]
+        self.assertEqual(
+            queryset.filter(customer=customer).datetimes('order_date', 'month'),
+            list(Order.objects.filter(customer=customer).datetimes('order_date', 'month')),
+        )
+        self.assertIsInstance(Order.objects.datetimes('order_date', 'year'), QuerySet)
+        res, queries = self.get_changelist('order')
+        self.assertFalse(any('DISTINCT' in sql for sql in queries))
+
+    def test_autocomplete_filters(self):
+        self.place_orders(3)
+        other = create_user('other@example.com', is_merchant=True)
+        create_product(other, Category.objects.get(), name='Other')
+
+        res, _ = self.get_changelist('product', merchant__id__exact=other.id)
+        self.assertEqual([product.name for product in res.context['cl'].result_list], ['Other'])
+        self.assertContains(res, 'admin-autocomplete')
+        self.assertNotContains(res, 'customer0@example.com')
+
+        res, _ = self.get_changelist('order', customer__id__exact=self.customers[1].id)
+        self.assertEqual(res.context['cl'].result_count, 1)
+
+    def test_autocomplete_filters_reject_malformed_ids(self):
+        for name, parameter in (('product', 'merchant__id__exact'), ('order', 'customer__id__exact')):
+            with self.subTest(name=name):
+                res = self.client.get(reverse(f'admin:store_{name}_changelist'), {parameter: 'abc'})
+
+                self.assertRedirects(res, reverse(f'admin:store_{name}_changelist') + '?e=1', fetch_redirect_response=False)
+
+
+@override_settings(READ_REPLICA_ALIAS='replica')
+class ReadReplicaRoutingTests(TransactionTestCase):
+    """Tests for routing catalogue and statistics reads to the read replica.
+
+    The replica mirrors the test database, so the tests tell the two apart by
+    the queries captured on each connection.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        get_cache().clear()
+        self.merchant = create_user('merchant@example.com', is_merchant=True)
+        self.category = Category.objects.create(name='Books')
+        self.product = create_product(self.merchant, self.category, name='Book')
+        self.client = APIClient()
+
+    def get(self, url):
+        """GET url and return the response with the number of queries run on each database."""
+        with CaptureQueriesContext(connections['default']) as primary, CaptureQueriesContext(connections['replica']) as replica:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        return res, len(primary), len(replica)
+
+    def test_catalogue_reads_use_replica(self):
+        for url in (
+            reverse('product-list'),
+            reverse('product-detail', args=[self.product.id]),
+            reverse('category-list'),
+            reverse('category-detail', args=[self.category.id]),
+            reverse('product-list-async'),
+            reverse('product-search') + '?q=book',
+        ):
+            with self.subTest(url=url):
+                res, primary, replica = self.get(url)
+                self.assertEqual(primary, 0)
+                self.assertGreater(replica, 0)
+                self.assertNotIn(PIN_COOKIE, res.cookies)
+
+    def test_statistics_reads_use_replica(self):
+        self.client.force_authenticate(self.merchant)
+        for url in (
+            reverse('merchant-dashboard'),
+            reverse('product-statistics', args=['2024-01-01', '2024-12-31', 5]),
+        ):
+            with self.subTest(url=url):
+                _, primary, replica = self.get(url)
+                self.assertEqual(primary, 0)
+                self.assertGreater(replica, 0)
+
+    def test_other_reads_use_primary(self):
+        self.client.force_authenticate(self.merchant)
+        _, primary, replica = self.get(reverse('order-list'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_write_pins_client_to_primary(self):
+        self.client.force_authenticate(self.merchant)
+        res = self.client.patch(reverse('product-update', args=[self.product.id]), {'price': '12.00'})
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(PIN_COOKIE, res.cookies)
+        self.assertEqual(res.cookies[PIN_COOKIE]['max-age'], settings.READ_REPLICA_STICKY_SECONDS)
+
+        res, primary, replica = self.get(reverse('product-detail', args=[self.product.id]))
+        self.assertEqual(res.json()['price'], '12.00')
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        # The user stays pinned without the cookie, e.g. from another device.
+        self.client.cookies.clear()
+        _, primary, replica = self.get(reverse('merchant-dashboard'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        self.client.force_authenticate(None)
+        _, primary, replica = self.get(reverse('product-list'))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    @override_settings(READ_REPLICA_ALIAS=None)
+    def test_without_replica(self):
+        _, primary, replica = self.get(reverse('product-list'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_router(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Product))
+        self.assertIsNone(router.db_for_write(Product))
+        self.assertEqual(Product.objects.db, 'default')
+
+        product = Product.objects.using('replica').get(pk=self.product.pk)
+        self.assertEqual(router.db_for_write(Product, instance=product), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'store'))
+        self.assertIsNone(router.allow_migrate('default', 'store'))
+
+
+class DatabaseConfigTests(TestCase):
+    """Tests for the environment-driven database configuration."""
+
+    def test_sqlite_defaults(self):
+        config = database_config(Path('/srv/app'), environ={})
+
+        self.assertEqual(config['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(config['NAME'], Path('/srv/app/db.sqlite3'))
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+        self.assertEqual(config['PRAGMAS'], {'busy_timeout': 5000, 'journal_mode': 'WAL', 'synchronous': 'NORMAL'})
+
+    def test_sqlite_options(self):
+        config = database_config(Path('/srv/app'), environ={
+            'DATABASE_NAME': '/data/store.sqlite3',
+            'DATABASE_CONN_MAX_AGE': '0',
+            'DATABASE_CONN_HEALTH_CHECKS': 'false',
+            'DATABASE_SQLITE_WAL': '0',
+            'DATABASE_SQLITE_BUSY_TIMEOUT': '250',
+        })
+
+        self.assertEqual(config['NAME'], '/data/store.sqlite3')
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertFalse(config['CONN_HEALTH_CHECKS'])
+        self.assertEqual(config['PRAGMAS'], {'busy_timeout': 250})
+
+    def test_postgresql(self):
+        environ = {
+            'DATABASE_ENGINE': 'postgresql',
+            'DATABASE_NAME': 'store',
+            'DATABASE_HOST': 'db.internal',
+            'DATABASE_REPLICA_HOST': 'replica.internal',
+        }
+        config = database_config(Path('/srv/app'), environ=environ)
+
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((config['NAME'], config['HOST']), ('store', 'db.internal'))
+        self.assertNotIn('PRAGMAS', config)
+        self.assertNotIn('DISABLE_SERVER_SIDE_CURSORS', config)
+
+        replica = replica_config(config, environ=environ)
+        self.assertEqual((replica['NAME'], replica['HOST']), ('store', 'replica.internal'))
+        self.assertEqual(replica['TEST'], {'MIRROR': 'default'})
+        self.assertTrue(replica_configured(environ))
+
+        config = database_config(Path('/srv/app'), environ={**environ, 'DATABASE_POOL': 'pgbouncer'})
+        self.assertTrue(config['DISABLE_SERVER_SIDE_CURSORS'])
+
+    def test_invalid_settings(self):
+        for environ in (
+            {'DATABASE_ENGINE': 'oracle'},
+            {'DATABASE_CONN_MAX_AGE': 'forever'},
+            {'DATABASE_ENGINE': 'postgresql', 'DATABASE_POOL': 'pgpool'},
+        ):
+            with self.subTest(environ=environ), self.assertRaises(ImproperlyConfigured):
+                database_config(Path('/srv/app'), environ=environ)
+
+    def test_sqlite_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.DATABASES['default']['PRAGMAS']['busy_timeout'])
+            cursor.execute('PRAGMA synchronous')
+            # 1 is NORMAL.
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_connection_benchmark(self):
+        seed_store(customers=2, merchants=1, categories=1, products=5, orders=1)
+
+        results = run_connection_benchmark(requests=3)
+
+        self.assertEqual(set(results), {'per-request', 'persistent', 'persistent-health-checks'})
+        for result in results.values():
+            self.assertEqual(set(result), {'latency_ms', 'connections_opened'})
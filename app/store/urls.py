@@ -1,25 +1,58 @@
+from django.conf import settings
 from django.urls import path
+from .async_views import AsyncCategoryListView, AsyncProductDetailView, AsyncProductListView
 from .views import (
     CategoryListCreateView,
     CategoryRetrieveUpdateDestroyView,
     ProductListView,
+    ProductSearchView,
     ProductDetailView,
     ProductCreateView,
+    ProductImportView,
     ProductUpdateView,
     ProductDeleteView,
     ProductStatisticsView,
-    CreateOrderView
+    CartCheckoutView,
+    CartItemView,
+    CartItemsView,
+    CartView,
+    CreateOrderView,
+    CustomerOrderListView,
+    MerchantDashboardView,
+    OrderExportView
 )
 
+# The regular catalogue URLs can be served by the async views, see store.async_views.
+if settings.STORE_ASYNC_CATALOGUE:
+    category_list_view = AsyncCategoryListView.as_view()
+    product_list_view = AsyncProductListView.as_view()
+    product_detail_view = AsyncProductDetailView.as_view()
+else:
+    category_list_view = CategoryListCreateView.as_view()
+    product_list_view = ProductListView.as_view()
+    product_detail_view = ProductDetailView.as_view()
+
 urlpatterns = [
     # ... other url patterns ...
-    path('categories/', CategoryListCreateView.as_view(), name='category-list'),
+    path('categories/', category_list_view, name='category-list'),
     path('categories/<int:pk>/', CategoryRetrieveUpdateDestroyView.as_view(), name='category-detail'),
-    path('products/', ProductListView.as_view(), name='product-list'),
-    path('products/<int:pk>/', ProductDetailView.as_view(), name='product-detail'),
+    path('products/', product_list_view, name='product-list'),
+    path('products/search/', ProductSearchView.as_view(), name='product-search'),
+    path('products/<int:pk>/', product_detail_view, name='product-detail'),
     path('products/create/', ProductCreateView.as_view(), name='product-create'),
+    path('products/import/', ProductImportView.as_view(), name='product-import'),
     path('products/update/<int:pk>/', ProductUpdateView.as_view(), name='product-update'),
     path('products/delete/<int:pk>/', ProductDeleteView.as_view(), name='product-delete'),
+    path('cart/', CartView.as_view(), name='cart'),
+    path('cart/items/', CartItemsView.as_view(), name='cart-items'),
+    path('cart/items/<int:product_id>/', CartItemView.as_view(), name='cart-item'),
+    path('cart/checkout/', CartCheckoutView.as_view(), name='cart-checkout'),
+    path('orders/', CustomerOrderListView.as_view(), name='order-list'),
     path('orders/create/', CreateOrderView.as_view(), name='create-order'),
+    path('orders/export/', OrderExportView.as_view(), name='order-export'),
+    path('merchant/dashboard/', MerchantDashboardView.as_view(), name='merchant-dashboard'),
+    path('async/categories/', AsyncCategoryListView.as_view(), name='category-list-async'),
+    path('async/products/', AsyncProductListView.as_view(), name='product-list-async'),
+    path('async/products/<int:pk>/', AsyncProductDetailView.as_view(), name='product-detail-async'),
     path('api/store/product-statistics/<str:date_from>/<str:date_to>/<int:num_products>/', ProductStatisticsView.as_view(), name='product-statistics'),
 ]
\ No newline at end of file
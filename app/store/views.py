@@ -1,13 +1,28 @@
 from rest_framework import generics, permissions, status
 from django_filters.rest_framework import DjangoFilterBackend
+from drf_spectacular.utils import extend_schema, extend_schema_view
 from rest_framework.filters import OrderingFilter
-from django.core.mail import send_mail
-from .serializers import ProductSerializer, CategorySerializer, OrderSerializer, ProductStatisticSerializer
-from .models import Product, Category, Order
+from .serializers import (
+    CartItemSerializer, CartQuantitySerializer, CartSerializer, CategorySerializer, CheckoutSerializer, MerchantDashboardSerializer,
+    OrderHistorySerializer, OrderSerializer, ProductRowSerializer, ProductSerializer, ProductStatisticSerializer, insufficient_stock_errors,
+)
+from .models import Product, Category, InsufficientStock, Order, OrderItem
 from rest_framework.views import APIView
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from .models import OrderItem
-from django.db.models import Count
+from .models import ProductDailySales
+from .pagination import AsyncPageNumberPagination, OrderHistoryPagination, ProductPagination
+from .cache import CachedResponseMixin
+from .conditional import ConditionalGetMixin
+from .search import SearchResults
+from .carts import CartFull, cart_contents, checkout, get_cart
+from .importing import IMPORT_FORMATS, import_format, import_products
+from .exporting import EXPORT_FORMATS, export_order_lines
+from .dashboard import get_dashboard
+from app.routers import ReplicaReadMixin
+from django.http import StreamingHttpResponse
+from django.conf import settings
+from django.db.models import Prefetch, Sum, prefetch_related_objects
 from datetime import datetime
 
 # custom permission classes
@@ -26,12 +41,13 @@ class IsSuperuser(permissions.BasePermission):
         return request.user.is_authenticated and request.user.is_superuser
 
 
-class CategoryListCreateView(generics.ListCreateAPIView):
-    queryset = Category.objects.all()
+class CategoryListCreateView(ReplicaReadMixin, CachedResponseMixin, ConditionalGetMixin, generics.ListCreateAPIView):
+    queryset = Category.objects.order_by('id')
     serializer_class = CategorySerializer
     permission_classes = [IsMerchantOrSuperuser]
+    pagination_class = AsyncPageNumberPagination
 
-class CategoryRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
+class CategoryRetrieveUpdateDestroyView(ReplicaReadMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsSuperuser]
@@ -41,14 +57,30 @@ class CategoryRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
             return [permissions.AllowAny()]
         return [permissions.IsAdminUser()]
 
-class ProductListView(generics.ListAPIView):
-    queryset = Product.objects.all()
-    serializer_class = ProductSerializer
+@extend_schema_view(get=extend_schema(responses=ProductSerializer(many=True)))
+class ProductListView(ReplicaReadMixin, CachedResponseMixin, ConditionalGetMixin, generics.ListAPIView):
+    # Pages are read as plain rows; ProductRowSerializer renders them like ProductSerializer.
+    queryset = Product.objects.order_by('id').values(*ProductRowSerializer.value_fields)
+    serializer_class = ProductRowSerializer
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_fields = ['name', 'category', 'description', 'price']
     ordering_fields = ['name', 'category', 'price']
+    pagination_class = ProductPagination
+
+class ProductSearchView(ReplicaReadMixin, CachedResponseMixin, generics.ListAPIView):
+    queryset = Product.objects.all()
+    serializer_class = ProductSerializer
+
+    def list(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({"error": "Provide a search query with the q parameter."}, status=400)
 
-class ProductDetailView(generics.RetrieveAPIView):
+        page = self.paginate_queryset(SearchResults(self.get_queryset(), query))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+class ProductDetailView(ReplicaReadMixin, CachedResponseMixin, ConditionalGetMixin, generics.RetrieveAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
 
@@ -60,6 +92,36 @@ class ProductCreateView(generics.CreateAPIView):
     def perform_create(self, serializer):
         serializer.save(merchant=self.request.user)
 
+class ProductImportView(APIView):
+    """Create or update the merchant's products in bulk, keyed on SKU.
+
+    Accepts a multipart upload in the `file` field, or a raw `text/csv` or
+    `application/x-ndjson` request body, and returns a per-row error report.
+    The format is guessed from the file name or content type unless given in
+    the `file_format` query parameter.
+    """
+    permission_classes = [IsMerchantUser]
+    parser_classes = [MultiPartParser]
+    stream_content_types = ('text/csv', 'application/x-ndjson')
+
+    def post(self, request):
+        if request.content_type.startswith(self.stream_content_types) and request.stream is not None:
+            lines = iter(request.stream.readline, b'')
+            file_format = import_format(request.content_type)
+        elif 'file' in request.FILES:
+            upload = request.FILES['file']
+            lines = upload
+            file_format = import_format(upload.name)
+        else:
+            return Response({"error": "Upload a CSV or NDJSON file in the file field."}, status=400)
+
+        # `format` itself is reserved by DRF for picking the response renderer.
+        file_format = request.query_params.get('file_format', file_format)
+        if file_format not in IMPORT_FORMATS:
+            return Response({"error": f"Unsupported format. Use one of: {', '.join(IMPORT_FORMATS)}."}, status=400)
+        report = import_products(request.user, lines, file_format=file_format)
+        return Response(report)
+
 class ProductUpdateView(generics.UpdateAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
@@ -90,34 +152,153 @@ class CreateOrderView(generics.CreateAPIView):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-    def perform_create(self, serializer):
-        order = serializer.save()
-        send_mail(
-            'Order Confirmation',
-            f'Your order with ID {order.id} has been placed successfully.',
-            'from@example.com',
-            [order.customer.email],
-            fail_silently=False,
+
+class CustomerOrderListView(generics.ListAPIView):
+    """The requesting customer's orders, newest first.
+
+    A page takes two queries whatever its size: the orders, then all of their
+    lines with the product name. Only the serialized columns are loaded.
+    """
+    serializer_class = OrderHistorySerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OrderHistoryPagination
+    filter_backends = []
+
+    def get_queryset(self):
+        items = OrderItem.objects.select_related('product').only(
+            'order_id', 'product_id', 'quantity', 'unit_price', 'product__name',
+        )
+        return Order.objects.filter(customer=self.request.user).only(
+            'id', 'order_date', 'delivery_address', 'payment_due', 'is_paid', 'total_price', 'item_count',
+        ).prefetch_related(Prefetch('items', queryset=items))
+
+
+class CartView(APIView):
+    """Show the user's cart with current prices, or empty it."""
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = CartSerializer
+
+    def get(self, request):
+        return Response(CartSerializer(cart_contents(get_cart(request.user))).data)
+
+    def delete(self, request):
+        get_cart(request.user).clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CartItemsView(APIView):
+    """Add a quantity of a product to the user's cart."""
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = CartItemSerializer
+
+    def post(self, request):
+        serializer = CartItemSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product_id = serializer.validated_data['product']
+        try:
+            quantity = get_cart(request.user).add(product_id, serializer.validated_data['quantity'])
+        except CartFull:
+            return Response({"error": f"A cart holds at most {settings.STORE_CART_MAX_ITEMS} products."}, status=400)
+        return Response({'product': product_id, 'quantity': quantity})
+
+
+class CartItemView(APIView):
+    """Change the quantity of a product in the user's cart, or remove it."""
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = CartQuantitySerializer
+
+    def put(self, request, product_id):
+        serializer = CartQuantitySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        quantity = serializer.validated_data['quantity']
+        if quantity and not Product.objects.filter(pk=product_id).exists():
+            return Response({"error": f"Invalid product id: {product_id}."}, status=400)
+        try:
+            get_cart(request.user).set(product_id, quantity)
+        except CartFull:
+            return Response({"error": f"A cart holds at most {settings.STORE_CART_MAX_ITEMS} products."}, status=400)
+        return Response({'product': product_id, 'quantity': quantity})
+
+    def delete(self, request, product_id):
+        get_cart(request.user).remove(product_id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CartCheckoutView(APIView):
+    """Place an order for the contents of the user's cart."""
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = CheckoutSerializer
+
+    def post(self, request):
+        serializer = CheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            order = checkout(get_cart(request.user), request.user, **serializer.validated_data)
+        except InsufficientStock as error:
+            return Response({"error": insufficient_stock_errors(error)}, status=400)
+        if order is None:
+            return Response({"error": "Your cart is empty."}, status=400)
+        prefetch_related_objects([order], 'items')
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+
+class OrderExportView(APIView):
+    """Stream the merchant's order lines between two dates as CSV or NDJSON.
+
+    Takes `date_from` and `date_to` (YYYY-MM-DD) and an optional `file_format`
+    query parameter.
+    """
+    permission_classes = [IsMerchantUser]
+
+    def get(self, request):
+        try:
+            date_from = datetime.strptime(request.query_params['date_from'], '%Y-%m-%d').date()
+            date_to = datetime.strptime(request.query_params['date_to'], '%Y-%m-%d').date()
+        except (KeyError, ValueError):
+            return Response({"error": "Use YYYY-MM-DD for the date_from and date_to parameters."}, status=400)
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            return Response({"error": f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}."}, status=400)
+
+        response = StreamingHttpResponse(
+            export_order_lines(request.user, date_from, date_to, file_format),
+            content_type=EXPORT_FORMATS[file_format],
         )
+        response['Content-Disposition'] = f'attachment; filename="orders-{date_from}-{date_to}.{file_format}"'
+        return response
 
-class ProductStatisticsView(APIView):
+
+class ProductStatisticsView(ReplicaReadMixin, APIView):
     permission_classes = [IsMerchantUser]
     serializer_class = ProductStatisticSerializer
 
     def get(self, request, date_from, date_to, num_products):
         try:
-            date_from = datetime.strptime(date_from, '%Y-%m-%d')
-            date_to = datetime.strptime(date_to, '%Y-%m-%d')
+            date_from = datetime.strptime(date_from, '%Y-%m-%d').date()
+            date_to = datetime.strptime(date_to, '%Y-%m-%d').date()
             num_products = int(num_products)
         except ValueError:
             return Response({"error": "Invalid date format or number. Use YYYY-MM-DD for dates and an integer for number of products."}, status=400)
 
-        product_stats = OrderItem.objects.filter(
-            order__order_date__range=(date_from, date_to)
+        # Served from the daily rollup, which is maintained on order creation.
+        product_stats = ProductDailySales.objects.filter(
+            merchant=request.user,
+            day__range=(date_from, date_to)
         ).values(
-            'product__name'
+            'product'
         ).annotate(
-            total_ordered=Count('id')
+            total_ordered=Sum('units')
+        ).values(
+            'product__name', 'total_ordered'
         ).order_by('-total_ordered')[:num_products]
 
-        return Response(product_stats)
\ No newline at end of file
+        return Response(product_stats)
+
+
+class MerchantDashboardView(ReplicaReadMixin, APIView):
+    """Sales figures of the requesting merchant over several windows, see store.dashboard."""
+    permission_classes = [IsMerchantUser]
+    serializer_class = MerchantDashboardSerializer
+
+    def get(self, request):
+        return Response(get_dashboard(request.user.id))
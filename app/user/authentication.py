@@ -0,0 +1,142 @@
+"""
+Token authentication backed by a cache.
+
+CachedTokenAuthentication keeps, for each token key, the user fields read by
+the API (flags used by permission checks plus the profile shown by /me) in a
+small in-process LRU cache and, optionally, a shared Django cache. A hit
+builds the user without querying the database; other fields are loaded
+lazily if they are ever read.
+
+Entries are dropped when a user is saved or deleted and when a token is
+deleted, see user.signals. Other processes drop their in-process entries
+only when AUTH_TOKEN_LOCAL_CACHE_TIMEOUT expires, which bounds how long a
+deactivated user or a changed merchant status can go unnoticed there.
+QuerySet.update() bypasses the signals and needs invalidate_user().
+"""
+import threading
+from collections import OrderedDict
+from functools import partial
+from hashlib import sha256
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import User
+
+CACHED_USER_FIELDS = (
+    'id', 'email', 'name', 'surname',
+    'is_active', 'is_staff', 'is_superuser', 'is_merchant',
+)
+
+
+class LocalTTLCache:
+    """Thread-safe LRU mapping whose entries expire after `timeout` seconds."""
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (monotonic() + self.timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LocalTTLCache(settings.AUTH_TOKEN_LOCAL_CACHE_SIZE, settings.AUTH_TOKEN_LOCAL_CACHE_TIMEOUT)
+
+
+def get_shared_cache():
+    """Return the shared token cache, or None when it is disabled."""
+    alias = settings.AUTH_TOKEN_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def token_cache_key(key):
+    # Hashed, so the keys of the shared cache are not working credentials.
+    return f'auth:token:{sha256(key.encode()).hexdigest()}'
+
+
+def invalidate_tokens(keys):
+    """Drop the cached users of the given token keys."""
+    shared_cache = get_shared_cache()
+    for key in keys:
+        local_cache.delete(key)
+        if shared_cache is not None:
+            shared_cache.delete(token_cache_key(key))
+
+
+def invalidate_user(user_id):
+    """Drop the cached entries of a user's tokens, now and once the transaction commits.
+
+    Dropping them again on commit keeps a request that read the old row in
+    the meantime from leaving it cached.
+    """
+    keys = list(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+    if keys:
+        invalidate_tokens(keys)
+        transaction.on_commit(partial(invalidate_tokens, keys))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication answering repeated requests from a cache."""
+
+    def authenticate_credentials(self, key):
+        values = local_cache.get(key)
+        if values is None:
+            shared_cache = get_shared_cache()
+            if shared_cache is not None:
+                values = shared_cache.get(token_cache_key(key))
+            if values is None:
+                values = self.load_user_values(key)
+                if shared_cache is not None:
+                    shared_cache.set(token_cache_key(key), values, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+            local_cache.set(key, values)
+
+        db = router.db_for_read(User)
+        # from_db() expects the values in the order of the model's fields.
+        field_names = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+        user = User.from_db(db, field_names, [values[name] for name in field_names])
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        token = Token.from_db(db, ['key', 'user_id'], [key, user.pk])
+        token.user = user
+        return user, token
+
+    def load_user_values(self, key):
+        try:
+            token = Token.objects.select_related('user').only(
+                'key', *(f'user__{field}' for field in CACHED_USER_FIELDS)
+            ).get(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        return {field: getattr(token.user, field) for field in CACHED_USER_FIELDS}
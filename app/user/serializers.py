@@ -10,8 +10,9 @@ from django.utils.translation import gettext as _
 
 
 from rest_framework import serializers
+from app.metrics import TimedSerializerMixin
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for the user object."""
 
     class Meta:
@@ -35,7 +36,7 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class AuthTokenSerializer(serializers.Serializer):
+class AuthTokenSerializer(TimedSerializerMixin, serializers.Serializer):
     """Serializer for the user auth token."""
     email = serializers.EmailField()
     password = serializers.CharField(
@@ -59,6 +60,6 @@ class AuthTokenSerializer(serializers.Serializer):
         attrs['user'] = user
         return attrs
 
-class MerchantStatusSerializer(serializers.Serializer):
+class MerchantStatusSerializer(TimedSerializerMixin, serializers.Serializer):
     user_id = serializers.IntegerField()
     status = serializers.BooleanField()
\ No newline at end of file
@@ -1,3 +1,89 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .authentication import get_shared_cache, local_cache
+from .models import User
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Tests for the cached token authentication."""
+
+    def setUp(self):
+        local_cache.clear()
+        get_shared_cache().clear()
+        self.user = User.objects.create_user('user@example.com', 'testpass123', name='Jane')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_cache_hit_needs_no_queries(self):
+        self.client.get(reverse('user:me'))
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(reverse('user:me'))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual((res.data['email'], res.data['name']), ('user@example.com', 'Jane'))
+        self.assertEqual(len(queries), 0)
+
+    def test_shared_cache_is_used_when_local_entry_is_missing(self):
+        self.client.get(reverse('user:me'))
+        local_cache.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('user:me')).status_code, 200)
+        self.assertEqual(len(queries), 0)
+
+    def test_shared_cache_keys_do_not_contain_tokens(self):
+        self.client.get(reverse('user:me'))
+
+        # The locmem backend keeps its entries in a dict of full keys.
+        keys = list(get_shared_cache()._cache)
+        self.assertTrue(any('auth:token:' in key for key in keys))
+        self.assertFalse(any(self.token.key in key for key in keys))
+
+    def test_merchant_status_change_invalidates_cache(self):
+        admin = User.objects.create_superuser('admin@example.com', 'testpass123')
+        admin_client = APIClient()
+        admin_client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=admin).key}')
+        self.assertFalse(self.client.get(reverse('user:me')).data['is_merchant'])
+
+        admin_client.post(reverse('user:set-merchant-status'), {'user_id': self.user.id, 'status': True})
+
+        self.assertTrue(self.client.get(reverse('user:me')).data['is_merchant'])
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(reverse('user:me'))
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get(reverse('user:me')).status_code, 401)
+
+    def test_deleted_token_is_rejected(self):
+        self.client.get(reverse('user:me'))
+
+        self.token.delete()
+
+        self.assertEqual(self.client.get(reverse('user:me')).status_code, 401)
+
+    def test_update_profile_through_cached_user(self):
+        self.client.get(reverse('user:me'))
+
+        res = self.client.patch(reverse('user:me'), {'surname': 'Doe', 'password': 'newpass123'})
+
+        self.assertEqual(res.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.surname, 'Doe')
+        self.assertEqual(self.user.name, 'Jane')
+        self.assertTrue(self.user.check_password('newpass123'))
+        self.assertEqual(self.client.get(reverse('user:me')).data['surname'], 'Doe')
+
+    def test_invalid_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        self.assertEqual(self.client.get(reverse('user:me')).status_code, 401)